@@ -0,0 +1,296 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import convert
+import manacost
+import vectormatch
+from convert import build_lotr_index, find_land_mana, find_similar_cards, is_land
+from deckconvert import convert_all_deck_files
+from deckfile import count_deck_cards
+
+# Benchmark harness for the conversion stages.
+#
+# Each case is a pair of card pools plus a tree of decks: either the checked-in
+# database.json, lotr.json and decks/ (the 'baseline' case) or deterministic synthetic
+# ones of a given size. Every stage is run once for its time and, unless --no-memory is
+# given, once more under tracemalloc for its peak memory; the match caches are cleared
+# before each run so both runs start cold. Results are written as JSON so two commits
+# can be compared with --compare.
+
+COLORS = ['W', 'U', 'B', 'R', 'G']
+RARITIES = ['common', 'uncommon', 'rare', 'mythic', 'special']
+RARITY_WEIGHTS = [45, 30, 18, 6, 1]
+BASIC_LAND_TYPES = {'W': 'Plains', 'U': 'Island', 'B': 'Swamp', 'R': 'Mountain', 'G': 'Forest'}
+CREATURE_TYPES = ['Elf', 'Human', 'Dwarf', 'Hobbit', 'Orc', 'Goblin', 'Wizard', 'Warrior', 'Knight', 'Soldier',
+                  'Spirit', 'Zombie', 'Dragon', 'Bird', 'Beast', 'Horror', 'Avatar', 'Cleric', 'Rogue', 'Scout']
+NAME_WORDS = ['Ancient', 'Bitter', 'Crimson', 'Dusk', 'Ember', 'Frost', 'Gilded', 'Hollow', 'Iron', 'Jade',
+              'Keen', 'Lost', 'Mire', 'Night', 'Oath', 'Pale', 'Quiet', 'Rune', 'Storm', 'Thorn']
+
+SYNTHETIC_SET_CODE = 'SYN'
+
+def random_mana_cost(rng, colors):
+    generic = rng.choice(['', '{1}', '{2}', '{3}', '{4}', '{5}', '{X}'])
+    symbols = []
+    for _ in range(rng.randint(1, 3)):
+        if len(colors) > 1 and rng.random() < 0.1:
+            symbols.append('{' + '/'.join(rng.sample(colors, 2)) + '}')
+        else:
+            symbols.append('{' + rng.choice(colors) + '}')
+    return generic + ''.join(symbols)
+
+def random_power_toughness(rng):
+    return rng.choice(['0', '1', '2', '3', '4', '5', '6', '*']), rng.choice(['1', '2', '3', '4', '5', '6', '*'])
+
+def make_card(name, card_type, mana_cost, rarity, text='', power='', toughness=''):
+    return {
+        "name": name,
+        "type": card_type,
+        "manaCost": mana_cost,
+        "rarity": rarity,
+        "setCode": SYNTHETIC_SET_CODE,
+        "text": text,
+        "power": power,
+        "toughness": toughness
+    }
+
+def land_text(colors):
+    return "{T}: Add " + " or ".join('{' + color + '}' for color in colors) + "."
+
+def random_card(rng, name):
+    """One random card; every type the converter treats differently shows up."""
+    rarity = rng.choices(RARITIES, RARITY_WEIGHTS)[0]
+    colors = rng.sample(COLORS, rng.choices([0, 1, 2, 3], [10, 55, 30, 5])[0])
+    kind = rng.choices(['creature', 'spell', 'permanent', 'land', 'planeswalker'], [45, 25, 15, 12, 3])[0]
+
+    if kind == 'land':
+        land_colors = colors or rng.sample(COLORS, 1)
+        text = land_text(land_colors + (['C'] if rng.random() < 0.2 else []))
+        return make_card(name, 'Land', '', rarity, text)
+    mana_cost = random_mana_cost(rng, colors) if colors else f"{{{rng.randint(1, 6)}}}"
+    if kind == 'creature':
+        subtypes = ' '.join(rng.sample(CREATURE_TYPES, rng.randint(1, 2)))
+        legendary = 'Legendary ' if rng.random() < 0.15 else ''
+        artifact = 'Artifact ' if not colors else ''
+        power, toughness = random_power_toughness(rng)
+        return make_card(name, f"{legendary}{artifact}Creature — {subtypes}", mana_cost, rarity, '', power, toughness)
+    if kind == 'planeswalker':
+        return make_card(name, f"Legendary Planeswalker — {name.split()[0]}", mana_cost, rarity)
+    if kind == 'permanent':
+        card_type = rng.choice(['Enchantment', 'Enchantment — Aura', 'Artifact', 'Artifact — Equipment'])
+        return make_card(name, card_type, mana_cost, rarity)
+    return make_card(name, rng.choice(['Instant', 'Sorcery']), mana_cost, rarity)
+
+def card_name(rng, prefix, index):
+    return f"{prefix}{rng.choice(NAME_WORDS)} {rng.choice(CREATURE_TYPES)} {index}"
+
+def generate_mtg_pool(card_count, seed=0):
+    """A deterministic MTG pool of card_count cards, including the basic lands."""
+    rng = random.Random(seed)
+    cards = [make_card(land_type, f"Basic Land — {land_type}", '', 'common', land_text([color]))
+             for color, land_type in BASIC_LAND_TYPES.items()]
+    cards += [random_card(rng, card_name(rng, '', index)) for index in range(len(cards), card_count)]
+    return cards[:card_count]
+
+def generate_lotr_pool(card_count, seed=1):
+    """A deterministic LOTR pool of card_count cards that every synthetic MTG card can match.
+
+    The pool always holds the basic lands, a land per color, a colorless artifact creature
+    per rarity and a creature per color for each rarity planeswalkers are matched at.
+    """
+    rng = random.Random(seed)
+    cards = [make_card(land_type, f"Basic Land — {land_type}", '', 'common', land_text([color]))
+             for color, land_type in BASIC_LAND_TYPES.items()]
+    cards += [make_card(f"LOTR Land {color}", 'Land', '', 'common', land_text([color, 'C'])) for color in COLORS]
+    for rarity in RARITIES[:4]:
+        power, toughness = random_power_toughness(rng)
+        cards.append(make_card(f"LOTR Golem {rarity}", 'Artifact Creature — Golem', '{3}', rarity, '', power, toughness))
+    for rarity in ['mythic', 'rare', 'uncommon']:
+        for color in COLORS:
+            cards.append(make_card(f"LOTR Hero {rarity} {color}", 'Creature — Human Knight', f"{{2}}{{{color}}}",
+                                   rarity, '', '3', '3'))
+    cards += [random_card(rng, card_name(rng, 'LOTR ', index)) for index in range(len(cards), card_count)]
+    for card in cards:
+        # The matcher only pools the four standard rarities on the LOTR side
+        if card['rarity'] == 'special':
+            card['rarity'] = 'rare'
+    return cards
+
+def generate_deck_tree(folder_path, deck_count, card_names, seed=2, decks_per_folder=100):
+    """Write deck_count deterministic .dck files under folder_path, decks_per_folder per subfolder."""
+    rng = random.Random(seed)
+    for deck_index in range(deck_count):
+        deck_folder = os.path.join(folder_path, f"folder{deck_index // decks_per_folder:03d}")
+        os.makedirs(deck_folder, exist_ok=True)
+        lines = ['[metadata]', f"Name=Deck {deck_index}", '[Main]']
+        lines += [f"{rng.randint(1, 4)} {name}|{SYNTHETIC_SET_CODE}|1"
+                  for name in rng.sample(card_names, min(len(card_names), rng.randint(15, 25)))]
+        lines += ['[Sideboard]']
+        lines += [f"{rng.randint(1, 2)} {name}|{SYNTHETIC_SET_CODE}|1"
+                  for name in rng.sample(card_names, min(len(card_names), rng.randint(0, 5)))]
+        with open(os.path.join(deck_folder, f"deck{deck_index:05d}.dck"), 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+
+def clear_match_caches():
+    """Forget every memoized parse and similarity so a stage runs cold."""
+    manacost.clear_caches()
+    convert.similarity_ratio.cache_clear()
+    convert.similarity_upper_bound.cache_clear()
+    convert.char_counts.cache_clear()
+
+def measure_stage(run, setup=None, trace_memory=True):
+    """Time run(*setup()) and, when trace_memory is set, record its peak traced memory in a second cold run."""
+    clear_match_caches()
+    arguments = setup() if setup else ()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        result = run(*arguments)
+        seconds = time.perf_counter() - start
+
+        peak_bytes = None
+        if trace_memory:
+            clear_match_caches()
+            arguments = setup() if setup else ()
+            tracemalloc.start()
+            try:
+                run(*arguments)
+                _, peak_bytes = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+    return result, {'seconds': round(seconds, 6), 'peak_bytes': peak_bytes}
+
+def run_case(name, mtg_cards, lotr_cards, deck_dir, workers=1, trace_memory=True, backend='python'):
+    """Run every stage over one case and return its JSON-ready results."""
+    stages = {}
+    _, stages['build_lotr_index'] = measure_stage(build_lotr_index, lambda: (lotr_cards,), trace_memory=trace_memory)
+
+    mtg_lands = [card for card in mtg_cards if is_land(card['type'])]
+    _, stages['find_land_mana'] = measure_stage(
+        lambda lotr_index: [find_land_mana(lotr_index, card) for card in mtg_lands],
+        lambda: (build_lotr_index(lotr_cards),), trace_memory=trace_memory)
+
+    converted_cards, stages['find_similar_cards'] = measure_stage(
+        lambda: find_similar_cards(mtg_cards, lotr_cards, 0.8, workers=workers, backend=backend),
+        trace_memory=trace_memory)
+    conversion_map = {}
+    for converted_card in converted_cards:
+        conversion_map.setdefault(converted_card['mtg_card'], (converted_card['lotr_card'], converted_card['setCode']))
+
+    _, stages['count_deck_cards'] = measure_stage(count_deck_cards, lambda: (deck_dir,), trace_memory=trace_memory)
+
+    with tempfile.TemporaryDirectory() as output_parent:
+        output_dir = os.path.join(output_parent, 'decks2')
+        _, stages['convert_all_deck_files'] = measure_stage(
+            lambda: convert_all_deck_files(deck_dir, output_dir, conversion_map, workers), trace_memory=trace_memory)
+
+    deck_count = sum(1 for root, _, files in os.walk(deck_dir) for filename in files if filename.endswith('.dck'))
+    return {
+        'name': name,
+        'mtg_cards': len(mtg_cards),
+        'lotr_cards': len(lotr_cards),
+        'mtg_lands': len(mtg_lands),
+        'decks': deck_count,
+        'backend': backend,
+        'stages': stages
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_results(previous, current):
+    """Print each stage's time and peak memory next to the previous results for the same case."""
+    previous_cases = {case['name']: case for case in previous['cases']}
+    for case in current['cases']:
+        previous_case = previous_cases.get(case['name'])
+        if previous_case is None:
+            continue
+        print(f"{case['name']} (was {previous.get('revision')}, now {current.get('revision')}):")
+        for stage, result in case['stages'].items():
+            previous_result = previous_case['stages'].get(stage)
+            if not previous_result:
+                continue
+            line = f"  {stage:<24}{previous_result['seconds']:>10.3f}s -> {result['seconds']:>10.3f}s"
+            if previous_result['seconds']:
+                line += f" ({result['seconds'] / previous_result['seconds']:.2f}x)"
+            if previous_result.get('peak_bytes') and result.get('peak_bytes'):
+                line += f", peak {previous_result['peak_bytes'] / 2**20:.1f} -> {result['peak_bytes'] / 2**20:.1f} MiB"
+            print(line)
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Time the conversion stages on the checked-in card "
+                                                            "pools and on synthetic ones of several sizes.")
+    parser.add_argument('--cards', type=int, nargs='*', default=[1000, 10000],
+                        help="sizes of the synthetic MTG pools (default: 1000 10000; e.g. 1000 10000 100000)")
+    parser.add_argument('--lotr-cards', type=int, default=1500,
+                        help="size of the synthetic LOTR pool (default: 1500, about the real set)")
+    parser.add_argument('--decks', type=int, nargs='*', default=[100, 1000],
+                        help="numbers of synthetic decks, one deck tree per size (default: 100 1000)")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic data (default: 0)")
+    parser.add_argument('--no-baseline', action='store_true',
+                        help="skip the case built from database.json, lotr.json and decks/")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="workers passed to find_similar_cards and convert_all_deck_files (default: 1)")
+    parser.add_argument('--backend', choices=['python', 'numpy'], default='python',
+                        help="ranking backend find_similar_cards uses (default: python)")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="only time the stages, without the second run under tracemalloc")
+    parser.add_argument('--output', help="write the results to this JSON file instead of stdout")
+    parser.add_argument('--compare', metavar='FILE', help="print the change against earlier results")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.backend == 'numpy' and not vectormatch.numpy_available():
+        parser.error("the numpy backend needs NumPy; install it with 'pip install numpy'")
+
+    results = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'cases': []
+    }
+    trace_memory = not args.no_memory
+
+    if not args.no_baseline:
+        print("Running the baseline case...", file=sys.stderr)
+        results['cases'].append(run_case('baseline', convert.load_card_file('database.json'),
+                                         convert.load_card_file('lotr.json'), 'decks', args.workers, trace_memory,
+                                         args.backend))
+
+    lotr_cards = generate_lotr_pool(args.lotr_cards, args.seed + 1)
+    for card_count in args.cards:
+        mtg_cards = generate_mtg_pool(card_count, args.seed)
+        card_names = [card['name'] for card in mtg_cards]
+        for deck_count in args.decks:
+            name = f"synthetic-{card_count}-cards-{deck_count}-decks"
+            print(f"Running {name}...", file=sys.stderr)
+            with tempfile.TemporaryDirectory() as deck_dir:
+                generate_deck_tree(deck_dir, deck_count, card_names, args.seed + 2)
+                results['cases'].append(run_case(name, mtg_cards, lotr_cards, deck_dir, args.workers, trace_memory,
+                                                 args.backend))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=4)
+    else:
+        print(json.dumps(results, indent=4))
+
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            compare_results(json.load(file), results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from array import array
+
+# Compact, memory-mapped cache of a JSON card list (database.json, lotr.json).
+#
+# The cache lives next to the JSON file as '<file>.store'. Every distinct string is stored
+# once and each field is a column of string ids. The cache remembers the size, mtime and
+# SHA-256 of the JSON it was built from and is rebuilt when they change.
+
+STORE_MAGIC = b'CARDSTR1'
+STORE_VERSION = 2  # 2 dropped the numeric columns nothing read
+MISSING = 0xFFFFFFFF  # String id of a field a card doesn't have
+
+def store_path_for(json_path):
+    return json_path + '.store'
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def build_card_store(json_path, store_path=None):
+    """Parse json_path once and write its columnar cache. Returns the store path."""
+    store_path = store_path or store_path_for(json_path)
+    stat = os.stat(json_path)
+    with open(json_path, 'r') as file:
+        cards = json.load(file)
+
+    fields = []
+    for card in cards:
+        for field in card:
+            if field not in fields:
+                fields.append(field)
+            if not isinstance(card[field], str):
+                raise ValueError(f"Card store only holds string fields; '{field}' in {json_path} is not a string")
+
+    # Intern every string once
+    string_ids = {}
+    strings = []
+    columns = {field: array('I') for field in fields}
+    for card in cards:
+        for field in fields:
+            value = card.get(field)
+            if value is None:
+                columns[field].append(MISSING)
+                continue
+            string_id = string_ids.get(value)
+            if string_id is None:
+                string_id = string_ids[value] = len(strings)
+                strings.append(value)
+            columns[field].append(string_id)
+
+    # One UTF-8 blob; offsets count code points so the decoded blob can be sliced directly
+    string_offsets = array('I', [0])
+    for value in strings:
+        string_offsets.append(string_offsets[-1] + len(value))
+    blob = ''.join(strings).encode('utf-8')
+
+    sections = [('string_offsets', string_offsets), ('strings', array('B', blob))]
+    sections += [(f"field:{field}", columns[field]) for field in fields]
+    # Lay the sections out 8-byte aligned after the header so they can be cast in place
+    layout = {}
+    offset = 0
+    for name, values in sections:
+        layout[name] = [offset, values.typecode, len(values)]
+        offset += -(-len(values) * values.itemsize // 8) * 8
+    header = json.dumps({
+        'version': STORE_VERSION,
+        'source_size': stat.st_size,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'source_sha256': file_sha256(json_path),
+        'rows': len(cards),
+        'fields': fields,
+        'sections': layout
+    }).encode('utf-8')
+    body_start = -(-(len(STORE_MAGIC) + 4 + len(header)) // 8) * 8
+
+    temp_path = store_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(STORE_MAGIC + struct.pack('<I', len(header)) + header)
+        for name, values in sections:
+            file.seek(body_start + layout[name][0])
+            file.write(values.tobytes())
+        file.truncate(body_start + offset)
+    os.replace(temp_path, store_path)
+    return store_path
+
+def read_store_header(store_path):
+    """Return the header of a store file and the offset its sections start at, or (None, 0)."""
+    with open(store_path, 'rb') as file:
+        prefix = file.read(len(STORE_MAGIC) + 4)
+        if len(prefix) < len(STORE_MAGIC) + 4 or prefix[:len(STORE_MAGIC)] != STORE_MAGIC:
+            return None, 0
+        header_length, = struct.unpack('<I', prefix[len(STORE_MAGIC):])
+        try:
+            header = json.loads(file.read(header_length))
+        except ValueError:
+            return None, 0
+    return header, -(-(len(STORE_MAGIC) + 4 + header_length) // 8) * 8
+
+class CardStore:
+    """Read-only view of a card store file, mapped into memory."""
+
+    def __init__(self, store_path):
+        self.header, self.body_start = read_store_header(store_path)
+        if self.header is None or self.header.get('version') != STORE_VERSION:
+            raise ValueError(f"'{store_path}' is not a card store")
+        with open(store_path, 'rb') as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.fields = self.header['fields']
+        self.rows = self.header['rows']
+        self.string_table = None
+
+    def __len__(self):
+        return self.rows
+
+    def section(self, name):
+        offset, typecode, length = self.header['sections'][name]
+        start = self.body_start + offset
+        view = memoryview(self.mmap)[start:start + length * array(typecode).itemsize]
+        return view.cast(typecode)
+
+    def all_strings(self):
+        """The interned string table, decoded on first use."""
+        if self.string_table is None:
+            text = self.section('strings').tobytes().decode('utf-8')
+            offsets = self.section('string_offsets').tolist()
+            self.string_table = [text[start:end] for start, end in zip(offsets, offsets[1:])]
+        return self.string_table
+
+    def values(self, field):
+        """All values of a text field, in row order (None where a card lacks the field)."""
+        strings = self.all_strings()
+        return [None if string_id == MISSING else strings[string_id]
+                for string_id in self.section(f"field:{field}").tolist()]
+
+    def cards(self):
+        """Rebuild the JSON card list, sharing one str object per distinct string."""
+        strings = self.all_strings()
+        columns = [self.section(f"field:{field}").tolist() for field in self.fields]
+        if all(MISSING not in column for column in columns):
+            return [dict(zip(self.fields, map(strings.__getitem__, row))) for row in zip(*columns)]
+        return [{field: strings[string_id] for field, string_id in zip(self.fields, row) if string_id != MISSING}
+                for row in zip(*columns)]
+
+def store_is_fresh(json_path, store_path):
+    """Check a store against its JSON source: mtime and size first, the content hash if those moved."""
+    if not os.path.exists(store_path):
+        return False
+    header, _ = read_store_header(store_path)
+    if header is None or header.get('version') != STORE_VERSION:
+        return False
+    stat = os.stat(json_path)
+    if header['source_size'] == stat.st_size and header['source_mtime_ns'] == stat.st_mtime_ns:
+        return True
+    # Touched but possibly unchanged (e.g. a fresh checkout): only the hash can tell
+    return header['source_size'] == stat.st_size and header['source_sha256'] == file_sha256(json_path)
+
+def open_card_store(json_path):
+    """Open the card store of json_path, (re)building it when it is missing or stale."""
+    store_path = store_path_for(json_path)
+    if not store_is_fresh(json_path, store_path):
+        build_card_store(json_path, store_path)
+    return CardStore(store_path)
+
+def load_cards(json_path):
+    """Drop-in for json.load on a card list file, served from its card store."""
+    try:
+        return open_card_store(json_path).cards()
+    except (OSError, ValueError):
+        # Read-only folder or a file the store can't hold: fall back to plain JSON
+        with open(json_path, 'r') as file:
+            return json.load(file)
+
+def load_columns(json_path, fields):
+    """Return one list of values per field of a card list file, without building per-card dicts."""
+    try:
+        store = open_card_store(json_path)
+        return [store.values(field) for field in fields]
+    except (OSError, ValueError):
+        with open(json_path, 'r') as file:
+            cards = json.load(file)
+        return [[card.get(field) for card in cards] for field in fields]
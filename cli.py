@@ -0,0 +1,33 @@
+import argparse
+import importlib
+
+# Single entry point for the whole pipeline. Each subcommand is a module with a
+# main(argv, prog) function, imported only when it runs, so e.g. 'convert' never
+# needs the requests package that 'fetch' uses.
+
+COMMANDS = {
+    'fetch': ('script', "fetch the Scryfall data of every card in a folder of .dck files"),
+    'massage': ('massager', "convert fetched Scryfall cards to the format convert reads"),
+    'convert': ('convert', "match MTG cards to their closest LOTR counterparts"),
+    'decks': ('deckconvert', "rewrite .dck files with the converted cards"),
+    'analyze': ('deckanalysis', "report unconverted cards, LOTR card reuse and off-color decks across all decks"),
+    'serve': ('server', "keep the card pools in memory and answer conversion requests over HTTP"),
+    'bench': ('benchmark', "time the conversion stages on real and synthetic card pools and decks")
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="MTG to LOTR card and deck conversion.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + '\n'.join(f"  {command:<10}{description}"
+                                         for command, (_, description) in COMMANDS.items()) +
+               "\n\nRun 'cli.py COMMAND --help' for the options of a command.")
+    parser.add_argument('command', choices=COMMANDS, metavar='COMMAND', help="one of the commands below")
+    parser.add_argument('arguments', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    module_name, _ = COMMANDS[args.command]
+    importlib.import_module(module_name).main(args.arguments, prog=f"{parser.prog} {args.command}")
+
+if __name__ == '__main__':
+    main()
@@ -1,42 +1,77 @@
+import argparse
+import hashlib
+import heapq
 import json
+import os
 from difflib import SequenceMatcher
+from functools import lru_cache
 import sys
-import re
+import time
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import vectormatch
+from cardstore import load_cards
+from instrumentation import RunReport
+from manacost import parse_mana_cost, parse_produced_mana
 
 used_cards = set()
 
+# Bump when the matcher changes in a way that invalidates cached rankings
+MATCH_CACHE_VERSION = 1
+
+# Pre-parsed view of a LOTR card, built once per run by build_lotr_index
+LotrRecord = namedtuple('LotrRecord', ['position', 'card', 'colors', 'mana_value', 'rarity', 'type', 'power_toughness'])
+
+# One ranked LOTR candidate for an MTG card, as returned by top_candidates
+Candidate = namedtuple('Candidate', ['card', 'position', 'score', 'type_score', 'power_toughness_score',
+                                     'colors_match', 'mana_value_delta'])
+
+BASIC_LANDS = ["Plains", "Forest", "Mountain", "Swamp", "Island"]
+
 def load_json_file(filename):
     """Load data from a JSON file."""
     with open(filename, 'r') as file:
         return json.load(file)
 
+def load_card_file(filename):
+    """Load a JSON card list through its memory-mapped card store cache."""
+    return load_cards(filename)
+
 def get_mana_value(mana_cost):
     """Calculate the total mana value from a mana cost string, accounting for both numeric and color symbols."""
-    if not mana_cost:
-        # If mana_cost is an empty string, treat it as zero mana
-        return 0
-
-    mana_value = 0
-    numeric_value = ''
-
-    for char in mana_cost:
-        if char.isdigit():
-            numeric_value += char
-        else:
-            if numeric_value:
-                mana_value += int(numeric_value)
-                numeric_value = ''
-            if char.isalpha():
-                mana_value += 1
-
-    if numeric_value:
-        mana_value += int(numeric_value)
-
-    return mana_value
+    return parse_mana_cost(mana_cost).mana_value
+
+@lru_cache(maxsize=None)
+def similarity_ratio(a, b):
+    """Return the SequenceMatcher ratio of two strings, computed once per distinct pair."""
+    return SequenceMatcher(None, a, b).ratio()
+
+@lru_cache(maxsize=None)
+def similarity_upper_bound(a, b):
+    """Return an upper bound of similarity_ratio from character counts alone (difflib's quick_ratio)."""
+    length = len(a) + len(b)
+    if not length:
+        return 1.0
+    matches = sum((char_counts(a) & char_counts(b)).values())
+    return 2.0 * matches / length
+
+@lru_cache(maxsize=None)
+def char_counts(text):
+    """Return the multiset of characters in text."""
+    return Counter(text)
+
+def ratio_evaluations():
+    """How many similarity ratios this process has actually computed (cache misses) so far."""
+    return similarity_ratio.cache_info().misses
 
 def similar(a, b, fuzziness):
     """Measure the similarity of two strings with adjustable fuzziness."""
-    return SequenceMatcher(None, a, b).ratio() >= fuzziness
+    return similarity_ratio(a, b) >= fuzziness
+
+def format_power_toughness(card):
+    """Return the 'power/toughness' string compared by the matcher."""
+    return f"{card.get('power', '')}/{card.get('toughness', '')}"
 
 def is_planeswalker(card_type):
     """Check if the card type includes 'Planeswalker'."""
@@ -44,23 +79,8 @@ def is_planeswalker(card_type):
 
 def extract_unique_colors(mana_cost):
     """Extract unique colors from the mana cost, treating hybrid mana as either color, and ignoring '{X}'."""
-    standard_colors = {'B', 'W', 'U', 'R', 'G'}
-    colors = set()
-
-    # Use a regular expression to find all occurrences of color symbols and hybrid symbols
-    color_symbols = re.findall(r'\{([BWURGCX2/\)]+)\}', mana_cost)
-
-    for symbol in color_symbols:
-        if symbol in standard_colors:
-            colors.add(symbol)
-        elif '/' in symbol:  # Handle hybrid mana symbols like {G/U}
-            for char in symbol:
-                if char in standard_colors:
-                    colors.add(char)
-        elif symbol.isalpha() and symbol != 'X':
-            colors.add('C')
-
-    return colors
+    # A fresh set each call: callers add and discard colors on the result
+    return set(parse_mana_cost(mana_cost).colors)
 
 def is_land(card_type):
     """Check if the card type includes 'Land'."""
@@ -78,7 +98,7 @@ def find_highest_mana_card_of_color(lotr_cards, colors):
                 best_card = card
     return best_card
 
-def find_strong_rare_creature_or_enchantment(lotr_cards, colors, card_type, mtg_mana_cost):
+def find_strong_rare_creature_or_enchantment(lotr_index, colors, card_type, mtg_mana_cost):
     """Find a strong creature or enchantment from the same colors, prioritizing mythic, then rare, then uncommon rarity."""
     best_card = None
     highest_power_toughness = -1
@@ -88,10 +108,10 @@ def find_strong_rare_creature_or_enchantment(lotr_cards, colors, card_type, mtg_
     is_colorless = colors == {'C'} or not colors
 
     for rarity in rarities:
-        for card in lotr_cards:
-            if card['type'].startswith(card_type) and card['rarity'] == rarity:
-                lotr_mana_cost = card.get('manaCost', '')
-                lotr_colors = extract_unique_colors(lotr_mana_cost)
+        for record in lotr_index['by_rarity'][rarity]:
+            card = record.card
+            if card['type'].startswith(card_type):
+                lotr_colors = record.colors
 
                 # Check color match; for colorless MTG cards, find colorless LOTR cards
                 if (is_colorless and lotr_colors == {'C'}) or (not is_colorless and all(color in lotr_colors for color in colors)):
@@ -109,60 +129,111 @@ def find_strong_rare_creature_or_enchantment(lotr_cards, colors, card_type, mtg_
 
     return best_card
 
-def rarity_match(mtg_rarity, lotr_rarity):
-    """Compare rarities, treating any non-standard rarity as 'rare'."""
-    if mtg_rarity not in ["common", "uncommon", "rare", "mythic"]:
-        mtg_rarity = "rare"
-    return mtg_rarity == lotr_rarity
+def normalize_rarity(rarity):
+    """Map any non-standard rarity (special, bonus, ...) to 'rare'."""
+    if rarity not in ["common", "uncommon", "rare", "mythic"]:
+        return "rare"
+    return rarity
+
+def build_lotr_index(lotr_cards):
+    """Parse every LOTR card once and bucket the records by rarity and color set."""
+    records = []
+    by_name = {}
+    by_rarity = defaultdict(list)
+    buckets = defaultdict(list)
+
+    for position, card in enumerate(lotr_cards):
+        mana_cost = card.get('manaCost', '')
+        parsed_cost = parse_mana_cost(mana_cost)
+        record = LotrRecord(position, card, parsed_cost.colors, parsed_cost.mana_value, card['rarity'], card['type'],
+                            format_power_toughness(card))
+        records.append(record)
+        by_name.setdefault(card['name'], card)  # First card wins, like the linear scan did
+        by_rarity[record.rarity].append(record)
+        buckets[(record.rarity, record.colors)].append(record)
+
+    # Lands: the first land producing each distinct mana set and each single color, in lotr.json order
+    lands_by_mana = {}
+    lands_by_color = {}
+    for record in records:
+        if is_land(record.type):
+            produced_mana = frozenset(parse_produced_mana(record.card.get('text', '')))
+            lands_by_mana.setdefault(produced_mana, record.card)
+            for color in produced_mana:
+                lands_by_color.setdefault(color, record.card)
+
+    basic_lands = {}
+    for land_name in BASIC_LANDS:
+        basic_lands[land_name] = basic_lands[f"Snow-Covered {land_name}"] = by_name.get(land_name)
+
+    return {
+        'records': records,
+        'by_name': by_name,
+        'by_rarity': by_rarity,
+        'buckets': buckets,
+        'candidates': {},
+        'scored': {},
+        'basic_lands': basic_lands,
+        'lands_by_mana': lands_by_mana,
+        'lands_by_color': lands_by_color,
+        'land_matches': {}
+    }
+
+def indexed_candidates(lotr_index, rarity, colors):
+    """Return the records of a rarity whose colors are a subset of colors, in lotr.json order."""
+    key = (rarity, colors)
+    candidates = lotr_index['candidates'].get(key)
+    if candidates is None:
+        candidates = []
+        for (bucket_rarity, bucket_colors), records in lotr_index['buckets'].items():
+            if bucket_rarity == rarity and bucket_colors <= colors:
+                candidates.extend(records)
+        # Keep the original pool order so first-match and tie-break results don't change
+        candidates.sort(key=lambda record: record.position)
+        lotr_index['candidates'][key] = candidates
+    return candidates
 
 def extract_land_mana(text):
-    """Extract and print the mana symbols generated by Land type cards from their text."""
-    mana_symbols = []
-    # Use regular expression to find and extract mana symbols like {W}, {B}, etc.
-    mana_matches = re.findall(r'\{([BWURGC])\}', text)
-    mana_symbols.extend(mana_matches)
-    return mana_symbols
-
-def find_land_mana(lotr_cards, mtg_card):
-    mtg_land_mana = extract_land_mana(mtg_card.get('text', ''))
-    matching_land = None
+    """Extract the mana symbols generated by Land type cards from their text."""
+    return list(parse_produced_mana(text))
 
-    basic_lands = ["Plains", "Forest", "Mountain", "Swamp", "Island"]
+def match_land(lotr_index, mtg_land_mana, is_basic):
+    """Resolve a land from the mana it produces; the result is cached per mana list."""
+    key = (is_basic, tuple(mtg_land_mana))
+    if key in lotr_index['land_matches']:
+        return lotr_index['land_matches'][key]
 
-    # Check if the MTG card name is a basic land or its Snow-Covered version
-    if mtg_card['name'] in basic_lands or mtg_card['name'].replace("Snow-Covered ", "") in basic_lands:
-        # Directly use the basic land name for matching
-        matching_land_name = mtg_card['name'].replace("Snow-Covered ", "")
-        matching_land = next((card for card in lotr_cards if card['name'] == matching_land_name), None)
-    else:
-        for num_colors in range(len(mtg_land_mana), 0, -1):
-            for card in lotr_cards:
-                if is_land(card['type']):
-                    lotr_land_text = card.get('text', '')
-                    lotr_land_mana = extract_land_mana(lotr_land_text)
-                    matching_colors = set(mtg_land_mana) & set(lotr_land_mana)
-                    if len(matching_colors) == num_colors:
-                        matching_land = card
-                        break
-            if matching_land:
-                break
+    matching_land = None
+    if not is_basic:
+        # The land sharing the most colors wins, the earliest one on a tie
+        wanted_mana = set(mtg_land_mana)
+        best_overlap = 0
+        for produced_mana, card in lotr_index['lands_by_mana'].items():
+            overlap = len(wanted_mana & produced_mana)
+            if overlap > best_overlap:
+                best_overlap = overlap
+                matching_land = card
 
     if not matching_land:
         for color in mtg_land_mana:
-            for card in lotr_cards:
-                if is_land(card['type']):
-                    lotr_land_text = card.get('text', '')
-                    if color in extract_land_mana(lotr_land_text):
-                        matching_land = card
-                        break
+            matching_land = lotr_index['lands_by_color'].get(color)
             if matching_land:
                 break
 
     if not matching_land:
-        for card in lotr_cards:
-            if is_land(card['type']) and 'C' in extract_land_mana(card.get('text', '')):
-                matching_land = card
-                break
+        matching_land = lotr_index['lands_by_color'].get('C')
+
+    lotr_index['land_matches'][key] = matching_land
+    return matching_land
+
+def find_land_mana(lotr_index, mtg_card):
+    mtg_land_mana = extract_land_mana(mtg_card.get('text', ''))
+
+    # Basic lands and their Snow-Covered versions match the basic land name directly
+    is_basic = mtg_card['name'] in lotr_index['basic_lands']
+    matching_land = lotr_index['basic_lands'][mtg_card['name']] if is_basic else None
+    if not matching_land:
+        matching_land = match_land(lotr_index, mtg_land_mana, is_basic)
 
     if matching_land is None:
         found_colors = ', '.join(mtg_land_mana)
@@ -171,54 +242,384 @@ def find_land_mana(lotr_cards, mtg_card):
 
     return matching_land
 
-def similar_criteria_check(lotr_card, mtg_card, fuzziness):
+def is_mana_color_similar(mtg_mana_cost, lotr_mana_cost):
+    return parse_mana_cost(mtg_mana_cost).colors == parse_mana_cost(lotr_mana_cost).colors
+
+def find_fuzzy_match_legacy(mtg_card, candidates, fuzziness):
+    """Re-scan the candidates at decreasing fuzziness until one passes, as the matcher originally did.
+
+    Returns the matched card (or None) and the fuzziness level it was found at, which
+    carries over to the next card.
+    """
     card_type = mtg_card['type']
-    type_match = similar(card_type, lotr_card['type'], fuzziness)
-    mtg_mana_cost = mtg_card.get('manaCost', '')
-    lotr_mana_cost = lotr_card.get('manaCost', '')
-    mana_match = is_mana_color_similar(mtg_mana_cost, lotr_mana_cost)
-    mtg_mana_value = get_mana_value(mtg_mana_cost)
-    lotr_mana_value = get_mana_value(lotr_mana_cost)
-    power_toughness_match = similar(f"{mtg_card.get('power', '')}/{mtg_card.get('toughness', '')}",
-                                    f"{lotr_card.get('power', '')}/{lotr_card.get('toughness', '')}", fuzziness)
-    return type_match and rarity_match(mtg_card['rarity'], lotr_card['rarity']) and power_toughness_match and mana_match
+    mtg_colors = parse_mana_cost(mtg_card.get('manaCost', '')).colors
+    mtg_power_toughness = format_power_toughness(mtg_card)
+
+    while fuzziness > 0:
+        best_lotro_card_for_criteria = None
+        best_lotro_mana_value = -1
+        for record in candidates:
+            type_match = SequenceMatcher(None, card_type, record.type).ratio() >= fuzziness
+            power_toughness_match = SequenceMatcher(None, mtg_power_toughness, record.power_toughness).ratio() >= fuzziness
+            if type_match and power_toughness_match:
+                if mtg_colors == record.colors:
+                    return record.card, fuzziness
+                if best_lotro_card_for_criteria is None or record.mana_value > best_lotro_mana_value:
+                    best_lotro_card_for_criteria = record.card
+                    best_lotro_mana_value = record.mana_value
+        if best_lotro_card_for_criteria:
+            return best_lotro_card_for_criteria, fuzziness
+        if fuzziness - 0.1 <= 0:
+            break
+        fuzziness -= 0.1
 
-def is_mana_color_similar(mtg_mana_cost, lotr_mana_cost):
-    mtg_colors = extract_unique_colors(mtg_mana_cost)
-    lotr_colors = extract_unique_colors(lotr_mana_cost)
-    return mtg_colors == lotr_colors
+    return None, fuzziness
+
+def scored_matcher(mtg_card, candidates):
+    """Score the candidates for one MTG card and return a function that picks its match.
+
+    A candidate passes a fuzziness level when both its type and power/toughness ratios
+    reach it, so its score is the lower of the two. Scores are only computed for
+    candidates whose cheap upper bound can reach the level being tried, and are shared
+    between calls of the returned function.
+
+    The returned function takes the starting fuzziness and gives back the same card as
+    find_fuzzy_match_legacy (as its LotrRecord, or None) and the level it settled on.
+    """
+    card_type = mtg_card['type']
+    mtg_colors = parse_mana_cost(mtg_card.get('manaCost', '')).colors
+    mtg_power_toughness = format_power_toughness(mtg_card)
+
+    upper_bounds = [min(similarity_upper_bound(card_type, record.type),
+                        similarity_upper_bound(mtg_power_toughness, record.power_toughness))
+                    for record in candidates]
+    scores = [None] * len(candidates)
+
+    def passes(position, fuzziness):
+        if upper_bounds[position] < fuzziness:
+            return False
+        if scores[position] is None:
+            record = candidates[position]
+            scores[position] = min(similarity_ratio(card_type, record.type),
+                                   similarity_ratio(mtg_power_toughness, record.power_toughness))
+        return scores[position] >= fuzziness
+
+    def match(fuzziness):
+        # Walk the levels with the same float arithmetic as the legacy loop
+        while fuzziness > 0:
+            if any(passes(position, fuzziness) for position in range(len(candidates))):
+                break
+            if fuzziness - 0.1 <= 0:
+                return None, fuzziness
+            fuzziness -= 0.1
+        else:
+            return None, fuzziness
+
+        best_record_for_criteria = None
+        for position, record in enumerate(candidates):
+            if not passes(position, fuzziness):
+                continue
+            if mtg_colors == record.colors:
+                return record, fuzziness
+            if best_record_for_criteria is None or record.mana_value > best_record_for_criteria.mana_value:
+                best_record_for_criteria = record
+
+        return best_record_for_criteria, fuzziness
+
+    return match
+
+def find_scored_match(mtg_card, candidates, fuzziness):
+    """Pick the same card as find_fuzzy_match_legacy while scoring every candidate at most once."""
+    record, fuzziness = scored_matcher(mtg_card, candidates)(fuzziness)
+    return (record.card if record else None), fuzziness
 
-def find_similar_cards(mtg_cards, lotr_cards, fuzziness):
+def scored_candidates(mtg_card, lotr_index):
+    """Score every candidate in a card's indexed pool, in lotr.json order.
+
+    Each Candidate carries the per-criterion scores; score is the lower of the type and
+    power/toughness ratios, i.e. the highest fuzziness the candidate passes at. Cards
+    with the same rarity, colors, type and power/toughness share one cached list.
+    """
+    card_type = mtg_card['type']
+    mtg_colors = parse_mana_cost(mtg_card.get('manaCost', '')).colors
+    mtg_power_toughness = format_power_toughness(mtg_card)
+    rarity = normalize_rarity(mtg_card['rarity'])
+
+    key = (rarity, mtg_colors, card_type, mtg_power_toughness)
+    scored = lotr_index['scored'].get(key)
+    if scored is None:
+        mtg_mana_value = get_mana_value(mtg_card.get('manaCost', ''))
+        scored = []
+        for record in indexed_candidates(lotr_index, rarity, mtg_colors):
+            type_score = similarity_ratio(card_type, record.type)
+            power_toughness_score = similarity_ratio(mtg_power_toughness, record.power_toughness)
+            scored.append(Candidate(record.card, record.position, min(type_score, power_toughness_score), type_score,
+                                    power_toughness_score, record.colors == mtg_colors,
+                                    record.mana_value - mtg_mana_value))
+        lotr_index['scored'][key] = scored
+    return scored
+
+def top_candidates(mtg_card, lotr_index, k=5):
+    """Return the k best LOTR candidates for a card, best first, with their per-criterion scores.
+
+    Candidates are ranked by score, then exact colors, then lotr.json order, through a
+    heap that never holds more than k of them.
+    """
+    if k <= 0:
+        return []
+    heap = []
+    for candidate in scored_candidates(mtg_card, lotr_index):
+        entry = (candidate.score, candidate.colors_match, -candidate.position, candidate)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry[:3] > heap[0][:3]:
+            heapq.heapreplace(heap, entry)
+    return [entry[-1] for entry in sorted(heap, key=lambda entry: entry[:3], reverse=True)]
+
+def find_alternative_match(mtg_card, lotr_index, best_match, fuzziness):
+    """Pick a replacement for an already used match: the first other card with the same rarity and
+    exact colors that passes the fuzziness level.
+
+    Only that bucket can qualify, and the scan stops at the first card that passes, so
+    candidates are scored on demand (through the same cached ratios as scored_candidates)
+    rather than the whole pool up front.
+    """
+    card_type = mtg_card['type']
+    mtg_power_toughness = format_power_toughness(mtg_card)
+    alt_key = (normalize_rarity(mtg_card['rarity']), parse_mana_cost(mtg_card.get('manaCost', '')).colors)
+    for record in lotr_index['buckets'].get(alt_key, []):
+        if record.card == best_match:
+            continue
+        if (similarity_upper_bound(card_type, record.type) < fuzziness
+                or similarity_upper_bound(mtg_power_toughness, record.power_toughness) < fuzziness):
+            continue
+        if (similarity_ratio(card_type, record.type) >= fuzziness
+                and similarity_ratio(mtg_power_toughness, record.power_toughness) >= fuzziness):
+            return record.card
+    return None
+
+def fuzziness_levels(fuzziness):
+    """Return every fuzziness level the matcher can reach when starting from fuzziness."""
+    levels = []
+    while fuzziness > 0:
+        levels.append(fuzziness)
+        fuzziness -= 0.1
+    return levels
+
+def needs_fuzzy_match(mtg_card, lotr_index):
+    """Check whether a card goes through the fuzzy matcher rather than a name, planeswalker or land lookup."""
+    return (mtg_card['name'] not in lotr_index['by_name']
+            and not is_planeswalker(mtg_card['type'])
+            and not is_land(mtg_card['type']))
+
+def rank_card(mtg_card, lotr_index, levels):
+    """Work out the fuzzy match of one card for every level the run could reach it at.
+
+    Entry i of the result is (LOTR position or None, index of the settled level) when
+    matching starts at levels[i]. Cards that don't need the fuzzy matcher get None.
+    """
+    if not needs_fuzzy_match(mtg_card, lotr_index):
+        return None
+
+    mtg_colors = parse_mana_cost(mtg_card.get('manaCost', '')).colors
+    candidates = indexed_candidates(lotr_index, normalize_rarity(mtg_card['rarity']), mtg_colors)
+    match = scored_matcher(mtg_card, candidates)
+
+    ranking = []
+    for level in levels:
+        record, settled = match(level)
+        if record is None:
+            ranking.append((None, len(levels) - 1))
+        else:
+            ranking.append((record.position, levels.index(settled)))
+    return ranking
+
+# Index of the LOTR pool inside each worker process, built once by init_rank_worker
+worker_lotr_index = None
+
+def init_rank_worker(lotr_cards):
+    global worker_lotr_index
+    worker_lotr_index = build_lotr_index(lotr_cards)
+
+def rank_cards(mtg_cards, levels):
+    """Rank a shard of MTG cards inside a worker process."""
+    return [rank_card(mtg_card, worker_lotr_index, levels) for mtg_card in mtg_cards]
+
+def rank_cards_in_parallel(mtg_cards, lotr_cards, levels, workers):
+    """Rank every MTG card across a process pool, keeping the input order."""
+    shard_size = max(1, -(-len(mtg_cards) // (workers * 4)))
+    shards = [mtg_cards[start:start + shard_size] for start in range(0, len(mtg_cards), shard_size)]
+    rankings = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_rank_worker, initargs=(lotr_cards,)) as executor:
+        for shard_rankings in executor.map(rank_cards, shards, [levels] * len(shards)):
+            rankings.extend(shard_rankings)
+    return rankings
+
+def report_unmatched_card(mtg_card, lotr_card, fuzziness):
+    """Print which criteria the last candidate failed for a card that could not be matched."""
+    card_type = mtg_card['type']
+    mtg_mana_value = get_mana_value(mtg_card.get('manaCost', ''))
+    criteria_values = {
+        'Card Type': card_type,
+        'Mana Cost': mtg_card.get('manaCost', ''),
+        'Rarity': mtg_card['rarity'],
+        'Power/Toughness': format_power_toughness(mtg_card)
+    }
+    failed_criteria = []
+    if lotr_card is None:
+        failed_criteria.append("Rarity")
+    else:
+        lotr_mana_value = get_mana_value(lotr_card.get('manaCost', ''))
+        if not similar(card_type, lotr_card['type'], fuzziness):
+            failed_criteria.append("Card Type")
+        if not is_mana_color_similar(mtg_card.get('manaCost', ''), lotr_card.get('manaCost', '')):
+            if mtg_mana_value > 10:
+                if mtg_mana_value > 15 and lotr_mana_value <= 15:
+                    failed_criteria.append("Mana Cost (Very High Cost)")
+                else:
+                    failed_criteria.append("Mana Cost (High Cost)")
+            else:
+                failed_criteria.append("Mana Cost")
+        if not similar(format_power_toughness(mtg_card), format_power_toughness(lotr_card), fuzziness):
+            failed_criteria.append("Power/Toughness")
+
+    print(f"No match found for '{mtg_card['name']}' with the following criteria: {criteria_values}")
+    print(f"Failed criteria: {', '.join(failed_criteria)}")
+
+def rank_all_cards(mtg_cards, lotr_cards, lotr_index, levels, workers=1, match_cache=None, report=None,
+                   backend='python'):
+    """Rank every card, reusing match_cache entries and computing the rest.
+
+    match_cache maps card fingerprints to rankings; it is updated in place to hold
+    exactly the current cards, so stale entries don't pile up between runs. When a
+    report is given, serial ranking time and ratio evaluations are charged to each card
+    (the numpy backend and --workers processes rank elsewhere and aren't counted).
+    backend 'numpy' ranks through vectormatch instead of rank_card.
+    """
+    if match_cache is None:
+        fingerprints = None
+        missing = list(range(len(mtg_cards)))
+    else:
+        fingerprints = [card_fingerprint(mtg_card) for mtg_card in mtg_cards]
+        missing = [position for position, fingerprint in enumerate(fingerprints) if fingerprint not in match_cache]
+
+    missing_cards = [mtg_cards[position] for position in missing]
+    if backend == 'numpy':
+        computed = vectormatch.rank_cards_vectorized(missing_cards, lotr_index, levels)
+    elif workers > 1:
+        computed = rank_cards_in_parallel(missing_cards, lotr_cards, levels, workers)
+    elif report is not None:
+        computed = []
+        for position, mtg_card in zip(missing, missing_cards):
+            started = time.perf_counter()
+            evaluations = ratio_evaluations()
+            computed.append(rank_card(mtg_card, lotr_index, levels))
+            report.add_card_time(position, mtg_card['name'], time.perf_counter() - started,
+                                 ratio_evaluations() - evaluations)
+    else:
+        computed = [rank_card(mtg_card, lotr_index, levels) for mtg_card in missing_cards]
+
+    if match_cache is None:
+        return computed
+
+    fresh_rankings = {fingerprints[position]: ranking for position, ranking in zip(missing, computed)}
+    rankings = [fresh_rankings[fingerprint] if fingerprint in fresh_rankings else match_cache[fingerprint]
+                for fingerprint in fingerprints]
+    match_cache.clear()
+    match_cache.update(zip(fingerprints, rankings))
+
+    if report is not None:
+        report.count('match_cache_reused', len(mtg_cards) - len(missing))
+        report.count('match_cache_recomputed', len(missing))
+    print(f"Match cache: {len(mtg_cards) - len(missing)} cards reused, {len(missing)} recomputed.")
+    return rankings
+
+def card_fingerprint(card):
+    """Return a content hash of a card record (or of a whole card list)."""
+    return hashlib.sha256(json.dumps(card, sort_keys=True).encode('utf-8')).hexdigest()
+
+def load_match_cache(filename, lotr_cards, levels):
+    """Load cached rankings, starting empty if the LOTR pool, the levels or the matcher changed."""
+    if not os.path.exists(filename):
+        return {}
+    try:
+        cache = load_json_file(filename)
+    except (OSError, ValueError):
+        print(f"Ignoring unreadable match cache '{filename}'.")
+        return {}
+    if (cache.get('version') != MATCH_CACHE_VERSION
+            or cache.get('lotr_pool') != card_fingerprint(lotr_cards)
+            or cache.get('levels') != levels):
+        return {}
+    return cache.get('rankings', {})
+
+def save_match_cache(filename, lotr_cards, levels, match_cache):
+    """Write the rankings together with the fingerprint of the pool they were computed against."""
+    with open(filename, 'w') as outfile:
+        # json.dumps encodes in C; json.dump streams through the much slower Python encoder
+        outfile.write(json.dumps({
+            'version': MATCH_CACHE_VERSION,
+            'lotr_pool': card_fingerprint(lotr_cards),
+            'levels': levels,
+            'rankings': match_cache
+        }))
+
+def find_similar_cards(mtg_cards, lotr_cards, fuzziness, legacy_fuzz=False, workers=1, match_cache=None,
+                       report=None, backend='python'):
+    """Convert every MTG card, recording stage timings and match statistics in report (a RunReport)."""
     global used_cards
+    # Start every run from an empty set so a long-lived process can convert more than once
+    used_cards = set()
     converted_cards = []
-    for mtg_card in mtg_cards:
+    report = report if report is not None else RunReport()
+    # The legacy loop runs SequenceMatcher directly, outside the similarity_ratio cache the count is based on
+    report.count_evaluations = not legacy_fuzz
+    with report.stage('index'):
+        lotr_index = build_lotr_index(lotr_cards)
+
+    # Fuzzy matches are ranked up front (from the cache or in parallel); the level carried
+    # between cards and the used_cards de-duplication are still resolved in order below.
+    levels = fuzziness_levels(fuzziness)
+    rankings = None
+    if not legacy_fuzz and (workers > 1 or match_cache is not None or backend == 'numpy'):
+        with report.stage('rank'):
+            rankings = rank_all_cards(mtg_cards, lotr_cards, lotr_index, levels, workers, match_cache, report,
+                                      backend)
+
+    for card_position, mtg_card in enumerate(mtg_cards):
+        report.start_card()
+        evaluations = ratio_evaluations()
+        card_stats = {}
+        path = 'exact'
         exact_match_found = False
-        best_match = None
-        for lotr_card in lotr_cards:
-            if mtg_card['name'] == lotr_card['name']:
-                exact_match_found = True
-                best_match = lotr_card
-                break
+        best_match = lotr_index['by_name'].get(mtg_card['name'])
+        if best_match:
+            exact_match_found = True
 
         if not exact_match_found:
             if is_planeswalker(mtg_card['type']):
+                path = 'planeswalker'
                 colors = extract_unique_colors(mtg_card.get('manaCost', ''))
                 if not colors:  # If the planeswalker is colorless
                     colors.add('W')  # Treat it as white
                 if 'C' in colors and len(colors) > 1:
                     colors.discard('C')
-                best_match = find_strong_rare_creature_or_enchantment(lotr_cards, colors, "Creature", mtg_card.get('manaCost', ''))
+                best_match = find_strong_rare_creature_or_enchantment(lotr_index, colors, "Creature", mtg_card.get('manaCost', ''))
                 if not best_match and len(colors) > 1:
                     for color in colors:
-                        best_match = find_strong_rare_creature_or_enchantment(lotr_cards, {color}, "Creature", mtg_card.get('manaCost', ''))
+                        best_match = find_strong_rare_creature_or_enchantment(lotr_index, {color}, "Creature", mtg_card.get('manaCost', ''))
                         if best_match:
                             break
 
                 if not best_match:
                     print(f"No match found for the planeswalker '{mtg_card['name']}' with any of the colors {colors}")
+                    report.fail(mtg_card['name'], f"no creature for the planeswalker colors {sorted(colors)}")
                     sys.exit(1)
             elif is_land(mtg_card['type']):
-                matching_land = find_land_mana(lotr_cards, mtg_card)
+                path = 'land'
+                matching_land = find_land_mana(lotr_index, mtg_card)
+                if not matching_land:
+                    report.count('unmatched_lands')
                 if matching_land:
                     converted_cards.append({
                         'mtg_card': mtg_card['name'],
@@ -226,77 +627,36 @@ def find_similar_cards(mtg_cards, lotr_cards, fuzziness):
                         'setCode': matching_land.get('setCode', '')
                     })
             else:
-                card_type = mtg_card['type']
-
-                mtg_colors = extract_unique_colors(mtg_card.get('manaCost', ''))
-
-                match_found = False
-                while not best_match and fuzziness > 0:
-                    best_lotro_card_for_criteria = None
-                    for lotr_card in lotr_cards:
-                        lotr_colors = extract_unique_colors(lotr_card.get('manaCost', ''))
-
-                        # Absolute check for color integrity
-                        if not mtg_colors.issuperset(lotr_colors):
-                            continue
-
-                        type_match = similar(card_type, lotr_card['type'], fuzziness)
-                        mtg_mana_value = get_mana_value(mtg_card.get('manaCost', ''))
-                        lotr_mana_value = get_mana_value(lotr_card.get('manaCost', ''))
-                        mana_match = is_mana_color_similar(mtg_card.get('manaCost', ''), lotr_card.get('manaCost', ''))
-                        power_toughness_match = similar(f"{mtg_card.get('power', '')}/{mtg_card.get('toughness', '')}",
-                                                        f"{lotr_card.get('power', '')}/{lotr_card.get('toughness', '')}", fuzziness)
-                        if type_match and rarity_match(mtg_card['rarity'], lotr_card['rarity']) and power_toughness_match:
-                            if mana_match:
-                                best_match = lotr_card
-                                match_found = True
-                                break
-                            else:
-                                if best_lotro_card_for_criteria is None or lotr_mana_value > get_mana_value(
-                                        best_lotro_card_for_criteria.get('manaCost', '')):
-                                    best_lotro_card_for_criteria = lotr_card
-                    if not best_match:
-                        if best_lotro_card_for_criteria:
-                            best_match = best_lotro_card_for_criteria
-                            match_found = True
-                        else:
-                            fuzziness -= 0.1
+                path = 'fuzzy'
+                mtg_colors = parse_mana_cost(mtg_card.get('manaCost', '')).colors
+
+                # Absolute check for color integrity and rarity, resolved once through the index
+                candidates = indexed_candidates(lotr_index, normalize_rarity(mtg_card['rarity']), mtg_colors)
+
+                if legacy_fuzz:
+                    best_match, fuzziness = find_fuzzy_match_legacy(mtg_card, candidates, fuzziness)
+                elif rankings is not None:
+                    lotr_position, level_index = rankings[card_position][levels.index(fuzziness)] if levels else (None, 0)
+                    best_match = lotr_cards[lotr_position] if lotr_position is not None else None
+                    fuzziness = levels[level_index] if levels else fuzziness
+                else:
+                    best_match, fuzziness = find_scored_match(mtg_card, candidates, fuzziness)
+                card_stats = {'pool_size': len(candidates), 'level': fuzziness}
 
                 if not best_match:
-                    criteria_values = {
-                        'Card Type': card_type,
-                        'Mana Cost': mtg_card.get('manaCost', ''),
-                        'Rarity': mtg_card['rarity'],
-                        'Power/Toughness': f"{mtg_card.get('power', '')}/{mtg_card.get('toughness', '')}"
-                    }
-                    failed_criteria = []
-                    if not type_match:
-                        failed_criteria.append("Card Type")
-                    if not mana_match:
-                        if mtg_mana_value > 10:
-                            if mtg_mana_value > 15 and lotr_mana_value <= 15:
-                                failed_criteria.append("Mana Cost (Very High Cost)")
-                            else:
-                                failed_criteria.append("Mana Cost (High Cost)")
-                        else:
-                            failed_criteria.append("Mana Cost")
-                    if not rarity_match(mtg_card['rarity'], lotr_card['rarity']):
-                        failed_criteria.append("Rarity")
-                    if not power_toughness_match:
-                        failed_criteria.append("Power/Toughness")
-
-                    print(f"No match found for '{mtg_card['name']}' with the following criteria: {criteria_values}")
-                    print(f"Failed criteria: {', '.join(failed_criteria)}")
+                    report_unmatched_card(mtg_card, candidates[-1].card if candidates else None, fuzziness)
+                    report.fail(mtg_card['name'], f"no candidate among {len(candidates)} passed at fuzziness {fuzziness}")
                     sys.exit(1)
+        report.lap(path)
 
         if best_match:
             if not exact_match_found and best_match['name'] in used_cards:
-                alternative_match = None
-                for alt_card in lotr_cards:
-                    if alt_card != best_match and similar_criteria_check(alt_card, mtg_card, fuzziness):
-                        alternative_match = alt_card
-                        break
+                report.count('used_card_collisions')
+                alternative_match = find_alternative_match(mtg_card, lotr_index, best_match, fuzziness)
+                if alternative_match:
+                    report.count('alternatives_found')
                 best_match = alternative_match if alternative_match else best_match
+                report.lap('dedup')
             
             used_cards.add(best_match['name'])
             converted_cards.append({
@@ -304,23 +664,117 @@ def find_similar_cards(mtg_cards, lotr_cards, fuzziness):
                 'lotr_card': best_match['name'],
                 'setCode': best_match.get('setCode', '')
             })
+        report.finish_card(card_position, mtg_card['name'], path, ratio_evaluations() - evaluations, **card_stats)
 
     return converted_cards
 
-# Paths to the JSON files
-mtg_json_file = 'database.json'
-lotr_json_file = 'lotr.json'
-
-# Load the data from JSON files
-mtg_cards = load_json_file(mtg_json_file)
-lotr_cards = load_json_file(lotr_json_file)
-
-# Initial fuzziness level (can be adjusted)
-initial_fuzziness = 0.8
-
-# Find similar cards and write them to 'converted.json'
-converted_cards = find_similar_cards(mtg_cards, lotr_cards, initial_fuzziness)
-if converted_cards:
-    with open('converted.json', 'w') as outfile:
-        json.dump(converted_cards, outfile, indent=4)
-    print("Conversion completed. Check 'converted.json' for results.")
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Convert MTG cards to their closest LOTR counterparts.")
+    parser.add_argument('--legacy-fuzz', action='store_true',
+                        help="use the original multi-pass fuzziness loop instead of the scored matcher (for diffing)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="rank cards across this many processes (default: 1, no pool)")
+    parser.add_argument('--cache', default='match_cache.json',
+                        help="file that keeps card rankings between runs (default: match_cache.json)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="rank every card from scratch and leave the cache file alone")
+    parser.add_argument('--explain', metavar='CARD',
+                        help="list the top LOTR candidates for one MTG card with their scores, then exit")
+    parser.add_argument('--top', type=int, default=5, help="number of candidates --explain lists (default: 5)")
+    parser.add_argument('--backend', choices=['python', 'numpy'], default='python',
+                        help="rank fuzzy matches in pure Python or with the vectorized NumPy backend "
+                             "(default: python)")
+    parser.add_argument('--validate-backend', action='store_true',
+                        help="rank every card with both backends and stop if any ranking differs")
+    parser.add_argument('--report', metavar='FILE',
+                        help="write stage timings and match statistics of the run to this JSON file")
+    parser.add_argument('--profile', action='store_true', help="add a cProfile summary to the --report file")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="add per-stage peak memory (tracemalloc) to the --report file")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.top < 1:
+        parser.error("--top must be at least 1")
+    if args.legacy_fuzz and args.workers > 1:
+        parser.error("--legacy-fuzz runs serially and cannot be combined with --workers")
+    if (args.profile or args.trace_memory) and not args.report:
+        parser.error("--profile and --trace-memory need --report")
+    if args.backend == 'numpy' or args.validate_backend:
+        if args.legacy_fuzz or args.workers > 1:
+            parser.error("the numpy backend runs serially and cannot be combined with --legacy-fuzz or --workers")
+        if not vectormatch.numpy_available():
+            parser.error("the numpy backend needs NumPy; install it with 'pip install numpy'")
+
+    report = RunReport(args.profile, args.trace_memory)
+    report.start()
+    try:
+        run(args, report)
+    except SystemExit as e:
+        if e.code and report.failure is None:
+            report.fail(None, f"exited with status {e.code}")
+        raise
+    finally:
+        report.stop()
+        if args.report:
+            report.write(args.report)
+
+def run(args, report):
+    # Paths to the JSON files
+    mtg_json_file = 'database.json'
+    lotr_json_file = 'lotr.json'
+
+    # Load the data from JSON files
+    with report.stage('load'):
+        mtg_cards = load_card_file(mtg_json_file)
+        lotr_cards = load_card_file(lotr_json_file)
+
+    if args.explain:
+        mtg_card = next((card for card in mtg_cards if card['name'] == args.explain), None)
+        if mtg_card is None:
+            print(f"No card named '{args.explain}' in {mtg_json_file}")
+            sys.exit(1)
+        for rank, candidate in enumerate(top_candidates(mtg_card, build_lotr_index(lotr_cards), args.top), 1):
+            print(f"{rank}. {candidate.card['name']} ({candidate.card.get('setCode', '')}): score {candidate.score:.3f}, "
+                  f"type {candidate.type_score:.3f}, power/toughness {candidate.power_toughness_score:.3f}, "
+                  f"exact colors {'yes' if candidate.colors_match else 'no'}, "
+                  f"mana value {candidate.mana_value_delta:+d}")
+        return
+
+    # Initial fuzziness level (can be adjusted)
+    initial_fuzziness = 0.8
+
+    if args.validate_backend:
+        with report.stage('validate'):
+            levels = fuzziness_levels(initial_fuzziness)
+            lotr_index = build_lotr_index(lotr_cards)
+            mismatches = vectormatch.validate_rankings(
+                mtg_cards, lotr_index, levels, vectormatch.rank_cards_vectorized(mtg_cards, lotr_index, levels))
+        if mismatches:
+            print(f"The numpy backend ranked {len(mismatches)} card(s) differently: {', '.join(mismatches[:20])}")
+            report.fail(mismatches[0], "numpy backend ranking differs from the pure-Python one")
+            sys.exit(1)
+        print(f"The numpy backend matches the pure-Python rankings for all {len(mtg_cards)} cards.")
+
+    # Reuse the rankings of cards that haven't changed since the last run
+    use_cache = not (args.no_cache or args.legacy_fuzz)
+    levels = fuzziness_levels(initial_fuzziness)
+    match_cache = None
+    if use_cache:
+        with report.stage('cache'):
+            match_cache = load_match_cache(args.cache, lotr_cards, levels)
+
+    # Find similar cards and write them to 'converted.json'
+    converted_cards = find_similar_cards(mtg_cards, lotr_cards, initial_fuzziness, args.legacy_fuzz, args.workers,
+                                         match_cache, report, args.backend)
+    if use_cache:
+        with report.stage('cache'):
+            save_match_cache(args.cache, lotr_cards, levels, match_cache)
+    if converted_cards:
+        with report.stage('write'):
+            with open('converted.json', 'w') as outfile:
+                json.dump(converted_cards, outfile, indent=4)
+        print("Conversion completed. Check 'converted.json' for results.")
+
+if __name__ == '__main__':
+    main()
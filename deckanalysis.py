@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from cardstore import load_columns
+from deckconvert import load_converted_cards
+from deckfile import DeckCard, iter_deck_files, read_deck_file
+from manacost import STANDARD_COLORS, parse_mana_cost
+
+# Library-wide deck analysis over the source decks and their converted counterparts.
+#
+# One pass over both deck trees builds an inverted index per tree:
+#
+#   deck_cards   deck path (relative to its tree) -> {card name: copies}
+#   card_decks   card name -> {deck path: copies}
+#
+# Every query is then a walk over one of those maps and the card colors, never over the
+# deck files again:
+#
+#   unconverted_cards()   converted decks that still list cards outside the LOTR pool
+#   lotr_card_usage()     how many decks and copies reuse each LOTR card
+#   off_color_decks()     converted decks with colors their source deck doesn't have
+#
+# A deck's colors are the colors in the mana costs of its cards (main and sideboard).
+
+SOURCE = 'source'
+CONVERTED = 'converted'
+
+class DeckTreeIndex:
+    """card -> decks and deck -> cards over one folder of .dck files."""
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.deck_cards = {}
+        self.card_decks = {}
+        self.errors = []
+
+    def add_deck(self, deck_path):
+        """Index one deck file; a deck with an invalid line is recorded in errors and left out."""
+        cards = {}
+        try:
+            for record in read_deck_file(deck_path):
+                if isinstance(record, DeckCard):
+                    if not record.count.isdigit():
+                        raise ValueError(f"Invalid line in file '{deck_path}' on line {record.line_number}: "
+                                         f"{record.line}")
+                    cards[record.name] = cards.get(record.name, 0) + int(record.count)
+        except ValueError as error:
+            self.errors.append(str(error))
+            return
+
+        deck = os.path.relpath(deck_path, self.folder_path)
+        self.deck_cards[deck] = cards
+        for card_name, copies in cards.items():
+            self.card_decks.setdefault(card_name, {})[deck] = copies
+
+    def build(self):
+        for deck_path in iter_deck_files(self.folder_path):
+            self.add_deck(deck_path)
+        return self
+
+def load_card_colors(json_path):
+    """Map each card name in a card list file to the colors of its mana cost (first entry wins)."""
+    card_colors = {}
+    for name, mana_cost in zip(*load_columns(json_path, ['name', 'manaCost'])):
+        if name not in card_colors:
+            card_colors[name] = parse_mana_cost(mana_cost or '').colors & STANDARD_COLORS
+    return card_colors
+
+class DeckLibrary:
+    """The source and converted deck trees, indexed, with the card data the queries need."""
+
+    def __init__(self, source_dir='decks', converted_dir='decks2', mtg_json_file='database.json',
+                 lotr_json_file='lotr.json', converted_json_file='converted.json'):
+        self.trees = {SOURCE: DeckTreeIndex(source_dir).build(), CONVERTED: DeckTreeIndex(converted_dir).build()}
+        self.mtg_colors = load_card_colors(mtg_json_file)
+        self.lotr_colors = load_card_colors(lotr_json_file)
+        self.conversion_map = load_converted_cards(converted_json_file)
+
+    @property
+    def source(self):
+        return self.trees[SOURCE]
+
+    @property
+    def converted(self):
+        return self.trees[CONVERTED]
+
+    def card_colors(self, card_name):
+        """Colors of a card by name, looked up in the LOTR pool first (unknown cards are colorless)."""
+        colors = self.lotr_colors.get(card_name)
+        if colors is None:
+            colors = self.mtg_colors.get(card_name, frozenset())
+        return colors
+
+    def deck_colors(self, tree, deck):
+        colors = set()
+        for card_name in self.trees[tree].deck_cards[deck]:
+            colors |= self.card_colors(card_name)
+        return colors
+
+    def decks_with_card(self, card_name):
+        """The decks of each tree that list card_name, with their copies."""
+        return {tree: index.card_decks.get(card_name, {}) for tree, index in self.trees.items()}
+
+    def unconverted_cards(self):
+        """Map each converted deck that still lists cards outside the LOTR pool to those cards."""
+        decks = {}
+        for card_name, card_decks in self.converted.card_decks.items():
+            if card_name not in self.lotr_colors:
+                for deck in card_decks:
+                    decks.setdefault(deck, []).append(card_name)
+        return {deck: sorted(card_names) for deck, card_names in sorted(decks.items())}
+
+    def unpaired_decks(self):
+        """Source decks without a converted deck, and converted decks whose source is gone."""
+        source_decks = self.source.deck_cards.keys()
+        converted_decks = self.converted.deck_cards.keys()
+        return {'not_converted': sorted(source_decks - converted_decks),
+                'without_source': sorted(converted_decks - source_decks)}
+
+    def lotr_card_usage(self):
+        """Each LOTR card in the converted decks with its deck count, copies and the MTG cards mapped to it,
+        most reused first."""
+        mapped_from = {}
+        for mtg_name, (lotr_name, _) in self.conversion_map.items():
+            mapped_from.setdefault(lotr_name, []).append(mtg_name)
+
+        usage = [{'card': card_name,
+                  'decks': len(card_decks),
+                  'copies': sum(card_decks.values()),
+                  'mapped_from': len(mapped_from.get(card_name, []))}
+                 for card_name, card_decks in self.converted.card_decks.items() if card_name in self.lotr_colors]
+        usage.sort(key=lambda entry: (-entry['decks'], -entry['copies'], entry['card']))
+        return usage
+
+    def off_color_decks(self):
+        """Converted decks with colors outside their source deck's colors, the extra colors and the cards
+        that bring them."""
+        decks = {}
+        for deck in sorted(self.converted.deck_cards.keys() & self.source.deck_cards.keys()):
+            extra_colors = self.deck_colors(CONVERTED, deck) - self.deck_colors(SOURCE, deck)
+            if extra_colors:
+                decks[deck] = {
+                    'colors': ''.join(sorted(extra_colors)),
+                    'cards': sorted(card_name for card_name in self.converted.deck_cards[deck]
+                                    if self.card_colors(card_name) & extra_colors)
+                }
+        return decks
+
+    def summary(self, top=25):
+        """The report --report writes: tree totals and the result of every query."""
+        unconverted = self.unconverted_cards()
+        return {
+            'trees': {tree: {'folder': index.folder_path,
+                             'decks': len(index.deck_cards),
+                             'distinct_cards': len(index.card_decks),
+                             'copies': sum(sum(cards.values()) for cards in index.deck_cards.values()),
+                             'errors': index.errors}
+                      for tree, index in self.trees.items()},
+            'unpaired_decks': self.unpaired_decks(),
+            'unconverted': {
+                'decks': len(unconverted),
+                'cards': len({card_name for card_names in unconverted.values() for card_name in card_names}),
+                'by_deck': unconverted
+            },
+            'lotr_card_usage': self.lotr_card_usage()[:top],
+            'off_color_decks': self.off_color_decks()
+        }
+
+def print_card_decks(library, card_name):
+    for tree, card_decks in library.decks_with_card(card_name).items():
+        print(f"{card_name} in {len(card_decks)} {tree} deck(s)")
+        for deck, copies in sorted(card_decks.items()):
+            print(f"  {copies} {deck}")
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Analyze the source and converted decks as a whole.")
+    parser.add_argument('--source-dir', default='decks', help="folder of source .dck files (default: decks)")
+    parser.add_argument('--converted-dir', default='decks2', help="folder of converted .dck files (default: decks2)")
+    parser.add_argument('--database', default='database.json', help="MTG card pool (default: database.json)")
+    parser.add_argument('--lotr', default='lotr.json', help="LOTR card pool (default: lotr.json)")
+    parser.add_argument('--converted', default='converted.json',
+                        help="card conversions written by convert.py (default: converted.json)")
+    parser.add_argument('--card', metavar='NAME', action='append', default=[],
+                        help="list the decks of both trees that use this card (repeatable)")
+    parser.add_argument('--unconverted', action='store_true',
+                        help="list the converted decks that still contain unconverted cards")
+    parser.add_argument('--usage', metavar='N', type=int, nargs='?', const=25,
+                        help="list the N most reused LOTR cards (default: 25)")
+    parser.add_argument('--off-color', action='store_true',
+                        help="list the converted decks with colors their source deck doesn't have")
+    parser.add_argument('--report', metavar='FILE', help="write the full summary report as JSON to FILE")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    library = DeckLibrary(args.source_dir, args.converted_dir, args.database, args.lotr, args.converted)
+    print(f"Indexed {len(library.source.deck_cards)} source and {len(library.converted.deck_cards)} converted "
+          f"decks in {time.perf_counter() - started:.2f}s.")
+    for index in library.trees.values():
+        for error in index.errors:
+            print(error)
+
+    for card_name in args.card:
+        print_card_decks(library, card_name)
+
+    if args.unconverted:
+        unconverted = library.unconverted_cards()
+        print(f"{len(unconverted)} converted deck(s) contain unconverted cards:")
+        for deck, card_names in unconverted.items():
+            print(f"  {deck}: {', '.join(card_names)}")
+
+    if args.usage is not None:
+        print("Most reused LOTR cards (decks, copies, MTG cards mapped to it):")
+        for entry in library.lotr_card_usage()[:args.usage]:
+            print(f"  {entry['decks']:>4} {entry['copies']:>5} {entry['mapped_from']:>4}  {entry['card']}")
+
+    if args.off_color:
+        off_color = library.off_color_decks()
+        print(f"{len(off_color)} converted deck(s) are outside their source deck's colors:")
+        for deck, details in off_color.items():
+            print(f"  {deck}: +{details['colors']} from {', '.join(details['cards'])}")
+
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(library.summary(), file, indent=4)
+        print(f"Summary report saved to '{args.report}'.")
+
+    if any(index.errors for index in library.trees.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
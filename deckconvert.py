@@ -1,16 +1,38 @@
+import argparse
+import ctypes
+import errno
+import hashlib
 import json
 import os
 import re
+import secrets
 import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from deckfile import DeckCard, iter_deck_files, read_deck, read_deck_file, render_deck, write_deck
+
+# Bump when the manifest layout changes; an older manifest triggers a full conversion
+DECK_MANIFEST_VERSION = 1
+
+# renameat2(2) arguments for swapping two paths in one step (Linux 3.15+)
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
 
 def load_converted_cards(filename='converted.json'):
-    """Load the converted cards mapping from a JSON file."""
+    """Load the converted cards from a JSON file as a mapping of MTG name to (LOTR name, set code).
+
+    Read as plain JSON, not through the card store: convert.py rewrites this file on every
+    run, so a store would almost always have to be rebuilt first.
+    """
     with open(filename, 'r') as file:
         converted_cards = json.load(file)
-    
-    # Ignore 'setCode' and only store the card name mapping
-    return {card['mtg_card']: card['lotr_card'] for card in converted_cards}
+
+    conversion_map = {}
+    for card in converted_cards:
+        # Names are unique in converted.json; if one ever repeats, keep its first entry
+        conversion_map.setdefault(card['mtg_card'], (card['lotr_card'], card.get('setCode', '')))
+    return conversion_map
 
 def extract_card_name(card_info):
     """Extract the card name from the card information."""
@@ -20,93 +42,307 @@ def extract_card_name(card_info):
         return card_name
     return None
 
-def convert_deck_file(input_path, output_dir, conversion_map, converted_cards):
-    """Convert a single deck file using the provided conversion map and save it to a new directory."""
-    with open(input_path, 'r') as file:
-        lines = file.readlines()
-
-    converted_lines = []
-    found_main = False  # Flag to track when [Main] section starts
-    found_sideboard = False  # Flag to track when [Sideboard] section starts
-    metadata_lines = []  # Store metadata lines
-
-    for line_number, line in enumerate(lines, start=1):  # Track line numbers
-        line = line.strip()
-        if line.lower().startswith("[main]"):
-            found_main = True
-            metadata_lines.append(line)  # Include [Main] in metadata
-            continue  # Skip the "[Main]" section header
-        elif line.lower().startswith("[sideboard]"):
-            found_sideboard = True
-            metadata_lines.append(line)  # Include [Sideboard] in metadata
-            continue  # Skip the "[Sideboard]" section header
-        elif line.startswith("[") and "]" in line:
-            # Preserve lines with brackets intact
-            metadata_lines.append(line)
-        elif found_main or found_sideboard:
-            if line:  # Check if the line is not empty
-                parts = line.split(' ', 1)
-                if len(parts) == 2:
-                    card_count, card_info = parts
-                    card_name_parts = card_info.split('|')
-                    if len(card_name_parts) >= 1:
-                        card_name = card_name_parts[0].strip()
-                        # Check if the card name is in the list of exceptions
-                        if card_name in conversion_map:
-                            lotr_card = conversion_map[card_name]  # Ignore set information
-                            set_code = next(card['setCode'] for card in converted_cards if card['mtg_card'] == card_name)
-                            converted_line = f"{card_count} {lotr_card}|{set_code}"
-                            converted_lines.append(converted_line)
-                        else:
-                            print(f"Card not found in file '{input_path}' on line {line_number}: {line}")  # Print notice
-                            converted_lines.append(line)  # Keep the original card in place
-                    else:
-                        converted_lines.append(line)
-                        print(f"Invalid line in file '{input_path}' on line {line_number}: {line}")  # Print filename and line
-                        sys.exit(1)  # Exit on the first error
-                else:
-                    converted_lines.append(line)
-                    print(f"Invalid line in file '{input_path}' on line {line_number}: {line}")  # Print filename and line
-                    sys.exit(1)  # Exit on the first error
-        else:
-            metadata_lines.append(line)  # Store metadata lines before [Main]
+def convert_deck_records(records, conversion_map, input_path='<deck>'):
+    """Convert the card entries of a stream of deck records, passing every other record through.
 
+    Cards missing from the conversion map keep their original line, with a notice naming
+    input_path and the line.
+    """
+    for record in records:
+        if isinstance(record, DeckCard):
+            # Check if the card name is in the list of exceptions
+            if record.name in conversion_map:
+                lotr_card, set_code = conversion_map[record.name]
+                record = record._replace(name=lotr_card, set_code=set_code, art='',
+                                         line=f"{record.count} {lotr_card}|{set_code}")
+            else:
+                print(f"Card not found in file '{input_path}' on line {record.line_number}: {record.line}")  # Print notice
+        yield record
+
+def convert_deck_file(input_path, output_dir, conversion_map):
+    """Convert a single deck file using the provided conversion map and save it to a new directory.
+
+    The deck is streamed from input_path to the output file. Raises ValueError on the first
+    line that isn't a valid card entry, in which case no output file is left behind.
+    """
     # Create the output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
 
     # Save the converted deck to the output directory with the same filename
     output_filename = os.path.basename(input_path)
     output_path = os.path.join(output_dir, output_filename)
-    with open(output_path, 'w') as file:
-        file.write('\n'.join(metadata_lines + ['[Main]'] + converted_lines))
+    temp_path = output_path + '.tmp'
+    try:
+        with open(temp_path, 'w') as file:
+            write_deck(file, convert_deck_records(read_deck_file(input_path), conversion_map, input_path))
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def convert_deck_lines(lines, conversion_map, input_path='<deck>'):
+    """Convert the lines of one deck and return the converted deck as text.
+
+    input_path only names the deck in notices and errors. Raises ValueError on the
+    first line that isn't a valid card entry.
+    """
+    return '\n'.join(render_deck(convert_deck_records(read_deck(lines, input_path), conversion_map, input_path)))
+
+def convert_all_deck_files(input_dir, output_dir, conversion_map, workers=1):
+    """Convert all .dck files in the input directory and save them to the output directory.
+
+    Decks are written to a temporary sibling of output_dir, which replaces output_dir
+    once every file converted, in a single atomic swap (see replace_directory).
+    Returns the per-file error messages; when there are any, output_dir is left as it was.
+    """
+    output_parent = os.path.dirname(os.path.abspath(output_dir))
+    # A unique name made with makedirs, so the tree gets the usual mode for the umask once it becomes output_dir
+    staging_dir = os.path.join(output_parent, f".{os.path.basename(output_dir)}-{os.getpid()}-{secrets.token_hex(4)}")
+    os.makedirs(staging_dir)
+
+    jobs = []
+    for input_path in iter_deck_files(input_dir):
+        relative_path = os.path.relpath(input_path, input_dir)
+        jobs.append((input_path, os.path.join(staging_dir, os.path.dirname(relative_path))))
+
+    def convert_job(job):
+        input_path, output_subdir = job
+        try:
+            convert_deck_file(input_path, output_subdir, conversion_map)
+        except (OSError, ValueError) as e:
+            return str(e)
+        return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            errors = [error for error in executor.map(convert_job, jobs) if error]
+        if not errors:
+            replace_directory(staging_dir, output_dir)
+    finally:
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir)
+
+    return errors
+
+def deck_manifest_entry(input_path, conversion_map, previous_entry=None):
+    """Describe a source deck for the manifest: its size, mtime, SHA-256 and the mapping of every card it lists.
+
+    When size and mtime match previous_entry, its hash is kept without reading the file.
+    """
+    stat = os.stat(input_path)
+    if (previous_entry and previous_entry['size'] == stat.st_size
+            and previous_entry['mtime_ns'] == stat.st_mtime_ns):
+        sha256 = previous_entry['sha256']
+    else:
+        with open(input_path, 'rb') as file:
+            sha256 = hashlib.sha256(file.read()).hexdigest()
+
+    mappings = {}
+    for record in read_deck_file(input_path):
+        if isinstance(record, DeckCard) and record.name not in mappings:
+            mapping = conversion_map.get(record.name)
+            mappings[record.name] = list(mapping) if mapping else None
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256, 'mappings': mappings}
+
+def load_deck_manifest(manifest_path, input_dir, output_dir):
+    """Load the manifest of the last incremental run, or None if it is missing or was for other folders."""
+    try:
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if (manifest.get('version') != DECK_MANIFEST_VERSION
+            or manifest.get('input_dir') != os.path.abspath(input_dir)
+            or manifest.get('output_dir') != os.path.abspath(output_dir)):
+        return None
+    return manifest
+
+def save_deck_manifest(manifest_path, input_dir, output_dir, decks):
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump({
+            'version': DECK_MANIFEST_VERSION,
+            'input_dir': os.path.abspath(input_dir),
+            'output_dir': os.path.abspath(output_dir),
+            'decks': decks
+        }, file)
+    os.replace(temp_path, manifest_path)
+
+def decks_using_cards(manifest_decks):
+    """Reverse the manifest: card name -> [(deck, mapping the deck was converted with)]."""
+    reverse_map = {}
+    for relative_path, entry in manifest_decks.items():
+        for card_name, mapping in entry['mappings'].items():
+            reverse_map.setdefault(card_name, []).append((relative_path, mapping))
+    return reverse_map
+
+def decks_with_changed_mappings(manifest_decks, conversion_map):
+    """Return the decks that list a card whose conversion changed since they were converted."""
+    changed_decks = set()
+    for card_name, uses in decks_using_cards(manifest_decks).items():
+        mapping = conversion_map.get(card_name)
+        current_mapping = list(mapping) if mapping else None
+        changed_decks.update(relative_path for relative_path, used_mapping in uses if used_mapping != current_mapping)
+    return changed_decks
+
+def convert_changed_deck_files(input_dir, output_dir, conversion_map, manifest_path, workers=1):
+    """Bring output_dir up to date with input_dir, reconverting only what changed since the last run.
+
+    A deck is reconverted when its source is new or changed, when any card it lists maps
+    differently now, or when its output is missing; outputs whose source disappeared are
+    deleted. Without a usable manifest every deck is converted through
+    convert_all_deck_files. Returns the per-file errors and counts of reconverted,
+    unchanged and removed decks; a deck that fails keeps its old output and is retried
+    on the next run.
+    """
+    manifest = load_deck_manifest(manifest_path, input_dir, output_dir)
+    if manifest is None or not os.path.isdir(output_dir):
+        errors = convert_all_deck_files(input_dir, output_dir, conversion_map, workers)
+        decks = {}
+        if not errors:
+            for input_path in iter_deck_files(input_dir):
+                decks[os.path.relpath(input_path, input_dir)] = deck_manifest_entry(input_path, conversion_map)
+            save_deck_manifest(manifest_path, input_dir, output_dir, decks)
+        return errors, {'reconverted': len(decks), 'unchanged': 0, 'removed': 0}
+
+    previous_decks = manifest['decks']
+    changed_mappings = decks_with_changed_mappings(previous_decks, conversion_map)
+
+    jobs = []
+    decks = {}
+    manifest_errors = []
+    for input_path in iter_deck_files(input_dir):
+        relative_path = os.path.relpath(input_path, input_dir)
+        previous_entry = previous_decks.get(relative_path)
+        try:
+            entry = deck_manifest_entry(input_path, conversion_map, previous_entry)
+        except (OSError, ValueError) as e:
+            # Keep the old output and its entry (if any); the source no longer matches it, so it is retried
+            manifest_errors.append(str(e))
+            if previous_entry is not None:
+                decks[relative_path] = previous_entry
+            continue
+        decks[relative_path] = entry
+        if (previous_entry is None or entry['sha256'] != previous_entry['sha256']
+                or relative_path in changed_mappings
+                or not os.path.exists(os.path.join(output_dir, relative_path))):
+            jobs.append((input_path, relative_path))
+
+    def convert_job(job):
+        input_path, relative_path = job
+        try:
+            convert_deck_file(input_path, os.path.join(output_dir, os.path.dirname(relative_path)), conversion_map)
+        except (OSError, ValueError) as e:
+            # Leave it out of the manifest so the next run tries again
+            decks.pop(relative_path, None)
+            return str(e)
+        return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        errors = [error for error in executor.map(convert_job, jobs) if error]
+
+    removed = 0
+    for relative_path in previous_decks.keys() - decks.keys():
+        if os.path.exists(os.path.join(input_dir, relative_path)):
+            continue  # Still there, it just failed to convert this time
+        output_path = os.path.join(output_dir, relative_path)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+            removed += 1
+            remove_empty_directories(os.path.dirname(output_path), output_dir)
+
+    save_deck_manifest(manifest_path, input_dir, output_dir, decks)
+    return manifest_errors + errors, {'reconverted': len(jobs) - len(errors),
+                                      'unchanged': len(decks) - len(jobs) + len(errors), 'removed': removed}
+
+def remove_empty_directories(directory, stop_dir):
+    """Remove directory and its parents while they are empty, stopping at stop_dir."""
+    stop_dir = os.path.abspath(stop_dir)
+    directory = os.path.abspath(directory)
+    while directory != stop_dir and directory.startswith(stop_dir) and not os.listdir(directory):
+        os.rmdir(directory)
+        directory = os.path.dirname(directory)
+
+def exchange_paths(path_a, path_b):
+    """Swap two existing paths atomically with renameat2(RENAME_EXCHANGE).
+
+    Raises OSError when the platform, kernel or filesystem can't exchange paths.
+    """
+    renameat2 = getattr(ctypes.CDLL(None, use_errno=True), 'renameat2', None) if sys.platform.startswith('linux') else None
+    if renameat2 is None:
+        raise OSError(errno.ENOSYS, "renameat2 is not available on this platform")
+    if renameat2(AT_FDCWD, os.fsencode(path_a), AT_FDCWD, os.fsencode(path_b), RENAME_EXCHANGE) != 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error), path_a, None, path_b)
+
+def replace_directory(new_dir, target_dir):
+    """Replace target_dir with new_dir so that readers always find one complete tree or the other.
+
+    An existing target_dir is exchanged with new_dir in one renameat2 call and the old
+    tree, now at new_dir, is deleted. Where renameat2 can't exchange paths (other
+    platforms, old kernels, some filesystems) it falls back to two back-to-back renames,
+    between which target_dir is briefly missing.
+    """
+    if not os.path.exists(target_dir):
+        os.rename(new_dir, target_dir)
+        return
 
-def convert_all_deck_files(input_dir, output_dir, conversion_map, converted_cards):
-    """Convert all .dck files in the input directory and save them to the output directory."""
-    # Delete the output directory if it exists
-    if os.path.exists(output_dir):
-        shutil.rmtree(output_dir)
+    try:
+        exchange_paths(new_dir, target_dir)
+    except OSError as e:
+        if e.errno not in (errno.ENOSYS, errno.EINVAL, errno.ENOTSUP):
+            raise
+        retired_dir = f"{new_dir}-old"
+        os.rename(target_dir, retired_dir)
+        os.rename(new_dir, target_dir)
+        new_dir = retired_dir
+    shutil.rmtree(new_dir)
 
-    for root, _, files in os.walk(input_dir):
-        for filename in files:
-            if filename.endswith('.dck'):
-                input_path = os.path.join(root, filename)
-                relative_path = os.path.relpath(input_path, input_dir)
-                output_subdir = os.path.join(output_dir, os.path.dirname(relative_path))
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Convert .dck files to their LOTR counterparts.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="convert this many deck files at once (default: 1)")
+    parser.add_argument('--input-dir', default='decks', help="folder of .dck files to convert (default: decks)")
+    parser.add_argument('--output-dir', default='decks2', help="folder the converted decks replace (default: decks2)")
+    parser.add_argument('--converted', default='converted.json',
+                        help="card conversions written by convert.py (default: converted.json)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only reconvert decks whose source or card conversions changed since the last "
+                             "incremental run, and delete outputs whose source is gone")
+    parser.add_argument('--manifest', default='deck_manifest.json',
+                        help="file --incremental keeps its record of converted decks in (default: deck_manifest.json)")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
 
-                # Convert the deck file and save it to the output directory
-                convert_deck_file(input_path, output_subdir, conversion_map, converted_cards)
+    # Load the conversion map from converted.json
+    conversion_map = load_converted_cards(args.converted)
 
-# Load the conversion map from converted.json
-conversion_map = load_converted_cards()
+    # Paths to the input and output directories
+    input_dir = args.input_dir
+    output_dir = args.output_dir
 
-# Load the converted cards list from converted.json
-converted_cards = json.load(open('converted.json', 'r'))
+    if args.incremental:
+        errors, counts = convert_changed_deck_files(input_dir, output_dir, conversion_map, args.manifest, args.workers)
+        for error in errors:
+            print(error)
+        print(f"Decks: {counts['reconverted']} reconverted, {counts['unchanged']} unchanged, "
+              f"{counts['removed']} removed.")
+        if errors:
+            print(f"{len(errors)} deck file(s) failed to convert and kept their previous output.")
+            sys.exit(1)
+        print("Conversion of deck files complete.")
+        return
 
-# Paths to the input and output directories
-input_dir = 'decks'  # Replace with the path to your input directory
-output_dir = 'decks2'  # Replace with the path to your output directory
+    # Convert all .dck files in the input directory and save them to the output directory
+    errors = convert_all_deck_files(input_dir, output_dir, conversion_map, args.workers)
+    if errors:
+        for error in errors:
+            print(error)
+        print(f"{len(errors)} deck file(s) failed to convert; '{output_dir}' was left unchanged.")
+        sys.exit(1)
 
-# Convert all .dck files in the input directory and save them to the output directory
-convert_all_deck_files(input_dir, output_dir, conversion_map, converted_cards)
+    print("Conversion of deck files complete.")
 
-print("Conversion of deck files complete.")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import os
+from collections import namedtuple
+
+# Streaming reader and writer for Forge .dck files.
+#
+# read_deck yields one typed record per meaningful line, so stages (fetch, convert,
+# validate, ...) can be chained as generators over a whole tree of decks while only one
+# line of one deck is in flight:
+#
+#   [metadata]            DeckSection
+#   Name=Adventure        DeckMetadata (any line outside [Main]/[Sideboard])
+#   [Main]                DeckSection, card entries follow
+#   2 Blood Artist|JMP|1  DeckCard
+#
+# Blank lines inside [Main] and [Sideboard] are skipped.
+
+DeckSection = namedtuple('DeckSection', ['line_number', 'name', 'line'])
+DeckMetadata = namedtuple('DeckMetadata', ['line_number', 'line'])
+DeckCard = namedtuple('DeckCard', ['line_number', 'count', 'name', 'set_code', 'art', 'section', 'line'])
+
+CARD_SECTIONS = ('main', 'sideboard')
+
+def parse_card_entry(line):
+    """Split a 'count name|set|art' entry into (count, name, set code, art), or return None."""
+    parts = line.split(' ', 1)
+    if len(parts) != 2:
+        return None
+    card_count, card_info = parts
+    card_name_parts = card_info.split('|')
+    card_name = card_name_parts[0].strip()
+    set_code = card_name_parts[1] if len(card_name_parts) > 1 else ''
+    art = card_name_parts[2] if len(card_name_parts) > 2 else ''
+    return card_count, card_name, set_code, art
+
+def read_deck(lines, deck_path='<deck>', invalid_lines=None):
+    """Yield the records of a deck from an iterable of lines (an open file works).
+
+    Raises ValueError on the first line in [Main] or [Sideboard] that isn't a card entry,
+    unless invalid_lines is a list: then the message is appended to it and the line is
+    skipped. deck_path only names the deck in that message.
+    """
+    card_section = None
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if line.startswith("[") and "]" in line:
+            section_name = line[1:line.index("]")].lower()
+            if section_name in CARD_SECTIONS:
+                card_section = section_name
+            yield DeckSection(line_number, section_name, line)
+        elif card_section is None:
+            yield DeckMetadata(line_number, line)
+        elif line:
+            card_entry = parse_card_entry(line)
+            if card_entry is None:
+                message = f"Invalid line in file '{deck_path}' on line {line_number}: {line}"
+                if invalid_lines is None:
+                    raise ValueError(message)
+                invalid_lines.append(message)
+                continue
+            yield DeckCard(line_number, *card_entry, card_section, line)
+
+def read_deck_file(deck_path, invalid_lines=None):
+    """Yield the records of a .dck file, reading it one line at a time (see read_deck)."""
+    with open(deck_path, 'r') as file:
+        yield from read_deck(file, deck_path, invalid_lines)
+
+def iter_deck_files(folder_path):
+    """Yield the path of every .dck file under folder_path, in os.walk order."""
+    for root, _, files in os.walk(folder_path):
+        for filename in files:
+            if filename.endswith('.dck'):
+                yield os.path.join(root, filename)
+
+def render_deck(records):
+    """Yield the lines of a converted deck: every header and metadata line, then [Main] with all the cards.
+
+    Only the card lines are held back, since they go after the last header.
+    """
+    card_lines = []
+    for record in records:
+        if isinstance(record, DeckCard):
+            card_lines.append(record.line)
+        else:
+            yield record.line
+    yield '[Main]'
+    yield from card_lines
+
+def write_deck(file, records):
+    """Write the rendered deck to an open file, one line at a time."""
+    for line_number, line in enumerate(render_deck(records)):
+        file.write(f"\n{line}" if line_number else line)
+
+def count_deck_cards(folder_path, invalid_lines=None):
+    """Walk the decks under folder_path once and return each card name that has a set
+    ('name|set'), in first-seen order, with the number of decks that list it.
+
+    Lines that aren't card entries are skipped, and listed in invalid_lines when given.
+    """
+    if invalid_lines is None:
+        invalid_lines = []
+    deck_counts = {}
+    for deck_path in iter_deck_files(folder_path):
+        deck_card_names = set()
+        for record in read_deck_file(deck_path, invalid_lines):
+            if isinstance(record, DeckCard) and '|' in record.line and record.name not in deck_card_names:
+                deck_card_names.add(record.name)
+                deck_counts[record.name] = deck_counts.get(record.name, 0) + 1
+    return deck_counts
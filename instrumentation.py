@@ -0,0 +1,162 @@
+import cProfile
+import heapq
+import json
+import platform
+import pstats
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+import manacost
+
+# Run report for convert.py: per-stage timers, match counters and per-card statistics,
+# with optional cProfile and tracemalloc hooks, written out as JSON.
+#
+# Stages are timed either as a block (with report.stage('index'): ...) or as laps inside
+# the per-card loop (report.lap('land') charges the time since the previous lap). Stages
+# must not nest when tracemalloc is on, since each one resets the traced peak.
+#
+# Each card also records its similarity ratio evaluations: the SequenceMatcher ratios
+# actually computed for it, which is the matching work the candidate pruning leaves.
+# Runs that compute ratios outside that count (--legacy-fuzz) clear count_evaluations,
+# which leaves them out of the report.
+
+class RunReport:
+    """Collects the timings and statistics of one conversion run."""
+
+    def __init__(self, profile=False, trace_memory=False, slowest_cards=25):
+        self.stages = {}
+        self.counters = Counter()
+        self.levels_reached = Counter()
+        self.cards = {}
+        self.slowest_cards = slowest_cards
+        self.count_evaluations = True
+        self.failure = None
+        self.profiler = cProfile.Profile() if profile else None
+        self.trace_memory = trace_memory
+        self.peak_bytes = None
+        self.started = None
+        self.finished = None
+        self.lap_started = None
+        self.card_started = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.profiler:
+            self.profiler.enable()
+
+    def stop(self):
+        if self.profiler:
+            self.profiler.disable()
+        self.finished = time.perf_counter()
+        if self.trace_memory and tracemalloc.is_tracing():
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def add_stage_time(self, name, seconds, peak_bytes=None):
+        stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        stage['seconds'] += seconds
+        stage['calls'] += 1
+        if peak_bytes is not None:
+            stage['peak_bytes'] = max(stage.get('peak_bytes', 0), peak_bytes)
+
+    @contextmanager
+    def stage(self, name):
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            peak_bytes = tracemalloc.get_traced_memory()[1] if self.trace_memory and tracemalloc.is_tracing() else None
+            self.add_stage_time(name, time.perf_counter() - started, peak_bytes)
+
+    def start_card(self):
+        self.card_started = self.lap_started = time.perf_counter()
+
+    def lap(self, name):
+        """Charge the time since the card started (or the last lap) to stage name."""
+        now = time.perf_counter()
+        self.add_stage_time(name, now - self.lap_started)
+        self.lap_started = now
+
+    def finish_card(self, position, name, path, evaluations=0, **stats):
+        """Record how one card was resolved; stats are e.g. pool_size= and level=."""
+        card = self.cards.setdefault(position, {'name': name, 'seconds': 0.0, 'evaluations': 0})
+        card['path'] = path
+        card['seconds'] += time.perf_counter() - self.card_started
+        card['evaluations'] += evaluations
+        card.update(stats)
+        self.counters[f"{path}_cards"] += 1
+        if 'level' in stats:
+            self.levels_reached[repr(stats['level'])] += 1
+
+    def add_card_time(self, position, name, seconds, evaluations=0):
+        """Charge work done for a card outside the per-card loop (e.g. ranking it up front)."""
+        card = self.cards.setdefault(position, {'name': name, 'seconds': 0.0, 'evaluations': 0})
+        card['seconds'] += seconds
+        card['evaluations'] += evaluations
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def fail(self, card_name, reason):
+        self.failure = {'card': card_name, 'reason': reason}
+
+    def profile_summary(self, limit=30):
+        """The functions with the most cumulative time, from the profiler."""
+        stats = pstats.Stats(self.profiler)
+        rows = []
+        for (filename, line_number, function), (_, calls, total_time, cumulative_time, _) in stats.stats.items():
+            rows.append({
+                'function': f"{filename}:{line_number}({function})",
+                'calls': calls,
+                'total_seconds': round(total_time, 6),
+                'cumulative_seconds': round(cumulative_time, 6)
+            })
+        return heapq.nlargest(limit, rows, key=lambda row: row['cumulative_seconds'])
+
+    def to_dict(self):
+        fuzzy_cards = [card for card in self.cards.values() if 'pool_size' in card]
+        cards = self.cards.values()
+        report = {
+            'status': 'failed' if self.failure else 'completed',
+            'failure': self.failure,
+            'python': platform.python_version(),
+            'seconds': round((self.finished or time.perf_counter()) - self.started, 6) if self.started else None,
+            'stages': {name: {**stage, 'seconds': round(stage['seconds'], 6)} for name, stage in self.stages.items()},
+            'counters': dict(self.counters),
+            'pool_size': {
+                'total': sum(card['pool_size'] for card in fuzzy_cards),
+                'max': max((card['pool_size'] for card in fuzzy_cards), default=0),
+                'mean': (sum(card['pool_size'] for card in fuzzy_cards) / len(fuzzy_cards)) if fuzzy_cards else 0
+            },
+            'levels_reached': dict(self.levels_reached),
+            'slowest_cards': [{**card, 'seconds': round(card['seconds'], 6)}
+                              for card in heapq.nlargest(self.slowest_cards, self.cards.values(),
+                                                         key=lambda card: card['seconds'])],
+            'caches': manacost.cache_stats()
+        }
+        if self.count_evaluations:
+            report['ratio_evaluations'] = {
+                'total': sum(card['evaluations'] for card in cards),
+                'max': max((card['evaluations'] for card in cards), default=0),
+                'mean': (sum(card['evaluations'] for card in fuzzy_cards) / len(fuzzy_cards)) if fuzzy_cards else 0,
+                'cards': [{'name': card['name'], 'evaluations': card['evaluations']}
+                          for card in heapq.nlargest(self.slowest_cards, cards, key=lambda card: card['evaluations'])]
+            }
+        else:
+            for card in report['slowest_cards']:
+                del card['evaluations']
+        if self.peak_bytes is not None:
+            report['peak_bytes'] = self.peak_bytes
+        if self.profiler:
+            report['profile'] = self.profile_summary()
+        return report
+
+    def write(self, filename):
+        with open(filename, 'w') as file:
+            json.dump(self.to_dict(), file, indent=4)
@@ -0,0 +1,91 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Shared, memoized parsing of mana costs and of the mana that rules text produces.
+#
+# Every distinct string is parsed once into an immutable record; the caches are bounded
+# so a long-lived process can't grow them without limit. cache_stats() reports hits and
+# misses for each cache.
+
+CACHE_SIZE = 4096
+
+COLOR_BITS = {'W': 1, 'U': 2, 'B': 4, 'R': 8, 'G': 16, 'C': 32}
+STANDARD_COLORS = frozenset({'B', 'W', 'U', 'R', 'G'})
+
+ManaCost = namedtuple('ManaCost', ['mana_value', 'colors', 'color_mask', 'is_hybrid', 'has_x', 'is_colorless'])
+
+def colors_to_mask(colors):
+    mask = 0
+    for color in colors:
+        mask |= COLOR_BITS[color]
+    return mask
+
+def count_mana_value(mana_cost):
+    """Total mana value of a mana cost string, accounting for both numeric and color symbols."""
+    mana_value = 0
+    numeric_value = ''
+
+    for char in mana_cost:
+        if char.isdigit():
+            numeric_value += char
+        else:
+            if numeric_value:
+                mana_value += int(numeric_value)
+                numeric_value = ''
+            if char.isalpha():
+                mana_value += 1
+
+    if numeric_value:
+        mana_value += int(numeric_value)
+
+    return mana_value
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_mana_cost(mana_cost):
+    """
+    Parse a mana cost such as '{2}{G/U}{X}' into a ManaCost.
+    Colors treat hybrid mana as either color, ignore '{X}', and record '{C}' as 'C'.
+    """
+    if not mana_cost:
+        # An empty mana cost is treated as zero mana
+        return ManaCost(0, frozenset(), 0, False, False, True)
+
+    colors = set()
+    is_hybrid = False
+    has_x = False
+
+    # Use a regular expression to find all occurrences of color symbols and hybrid symbols
+    for symbol in re.findall(r'\{([BWURGCX2/\)]+)\}', mana_cost):
+        if symbol in STANDARD_COLORS:
+            colors.add(symbol)
+        elif '/' in symbol:  # Handle hybrid mana symbols like {G/U}
+            is_hybrid = True
+            for char in symbol:
+                if char in STANDARD_COLORS:
+                    colors.add(char)
+        elif symbol == 'X':
+            has_x = True
+        elif symbol.isalpha():
+            colors.add('C')
+
+    colors = frozenset(colors)
+    return ManaCost(count_mana_value(mana_cost), colors, colors_to_mask(colors), is_hybrid, has_x,
+                    not (colors & STANDARD_COLORS))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_produced_mana(text):
+    """Return the mana symbols ({W}, {B}, ..., {C}) in a card's text, in order, as a tuple."""
+    return tuple(re.findall(r'\{([BWURGC])\}', text))
+
+def cache_stats():
+    """Hit/miss counters of the parsing caches, to check that they are doing their job."""
+    stats = {}
+    for name, cached_function in (('mana_cost', parse_mana_cost), ('produced_mana', parse_produced_mana)):
+        info = cached_function.cache_info()
+        stats[name] = {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize}
+    return stats
+
+def clear_caches():
+    parse_mana_cost.cache_clear()
+    parse_produced_mana.cache_clear()
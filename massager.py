@@ -1,47 +1,280 @@
+import argparse
 import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-def convert_to_new_format(input_file, output_file):
-    # Load the existing cards from the input JSON file
-    with open(input_file, 'r') as file:
-        existing_cards = json.load(file)
-
-    # Create a list to store the cards in the new format
-    new_format_cards = []
-
-    for card_name, card_data in existing_cards.items():
-        # Extract relevant information from card_data
-        card_type = card_data.get("type_line", "")
-        mana_cost = card_data.get("mana_cost", "")
-        rarity = card_data.get("rarity", "")
-        set_code = card_data.get("setCode", "")
-        text = card_data.get("oracle_text", "")
-        power = card_data.get("power", "")
-        toughness = card_data.get("toughness", "")
-
-        # Create a dictionary in the new format
-        formatted_card_data = {
-            "name": card_name,
-            "type": card_type,
-            "manaCost": mana_cost,
-            "rarity": rarity,
-            "setCode": set_code,
-            "text": text,
-            "power": power,
-            "toughness": toughness
-        }
-
-        # Add the formatted card data to the list
-        new_format_cards.append(formatted_card_data)
+from deckfile import count_deck_cards
+
+# The fields convert.py reads from every card; the required ones must not be empty
+MASSAGED_CARD_FIELDS = ('name', 'type', 'manaCost', 'rarity', 'setCode', 'text', 'power', 'toughness')
+REQUIRED_CARD_FIELDS = ('name', 'type', 'rarity')
+
+MASSAGE_CHUNK_SIZE = 1000  # Cards massaged per chunk (and per worker task)
+
+# Where both massager.py and script.py --bulk-data write the massaged cards by default
+MASSAGED_CARDS_FILE = 'all_cards_massaged.json'
+
+def massage_card(card_name, card_data):
+    """Convert one Scryfall card record to the format convert.py reads.
+
+    Double-faced, split, flip and adventure cards keep some fields only under card_faces:
+    a missing type line or rules text is joined from all faces, and a missing mana cost,
+    power or toughness comes from the front face.
+    """
+    card_faces = card_data.get("card_faces") or []
+    front_face = card_faces[0] if card_faces else {}
+
+    # Extract relevant information from card_data
+    card_type = card_data.get("type_line", " // ".join(face.get("type_line", "") for face in card_faces))
+    mana_cost = card_data.get("mana_cost", front_face.get("mana_cost", ""))
+    rarity = card_data.get("rarity", "")
+    set_code = card_data.get("setCode", "")
+    text = card_data.get("oracle_text", "\n//\n".join(face.get("oracle_text", "") for face in card_faces))
+    power = card_data.get("power", front_face.get("power", ""))
+    toughness = card_data.get("toughness", front_face.get("toughness", ""))
+
+    # Create a dictionary in the new format
+    return {
+        "name": card_name,
+        "type": card_type,
+        "manaCost": mana_cost,
+        "rarity": rarity,
+        "setCode": set_code,
+        "text": text,
+        "power": power,
+        "toughness": toughness
+    }
+
+def validate_massaged_card(card):
+    """Return what is wrong with a massaged card for convert.py, as a list of messages (empty when valid)."""
+    problems = [f"missing '{field}'" for field in MASSAGED_CARD_FIELDS if field not in card]
+    problems += [f"'{field}' is not a string" for field in MASSAGED_CARD_FIELDS
+                 if field in card and not isinstance(card[field], str)]
+    problems += [f"empty '{field}'" for field in REQUIRED_CARD_FIELDS
+                 if isinstance(card.get(field), str) and not card[field]]
+    return problems
+
+def massage_chunk(items):
+    """Massage and validate a chunk of (name, Scryfall card) pairs; returns the valid cards and the errors."""
+    cards = []
+    errors = []
+    for card_name, card_data in items:
+        card = massage_card(card_name, card_data)
+        problems = validate_massaged_card(card)
+        if problems:
+            errors.append(f"Invalid card '{card_name}': {', '.join(problems)}")
+        else:
+            cards.append(card)
+    return cards, errors
+
+def iter_chunks(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def massage_chunks(items, workers=1, chunk_size=MASSAGE_CHUNK_SIZE):
+    """Yield (cards, errors) for each chunk of items, in order.
+
+    With workers > 1 the chunks are massaged in a process pool that never has more than
+    two chunks per worker in flight, so memory stays bounded by the chunk size.
+    """
+    if workers <= 1:
+        for chunk in iter_chunks(items, chunk_size):
+            yield massage_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in iter_chunks(items, chunk_size):
+            pending.append(executor.submit(massage_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def convert_to_new_format(input_file, output_file, workers=1, chunk_size=MASSAGE_CHUNK_SIZE):
+    """
+    Stream the fetched cards (a JSON object of name -> Scryfall card) from input_file, massage
+    and validate them in chunks and write them to output_file one at a time. Returns the
+    validation errors; output_file is only replaced when there are none.
+    """
+    errors = []
+
+    def massaged_cards():
+        with open(input_file, 'r') as file:
+            for cards, chunk_errors in massage_chunks(iter_json_object(file), workers, chunk_size):
+                errors.extend(chunk_errors)
+                yield from cards
 
     # Save the cards in the new format to the output JSON file
+    temp_path = output_file + '.tmp'
+    try:
+        write_massaged_cards(temp_path, massaged_cards())
+        if not errors:
+            os.replace(temp_path, output_file)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return errors
+
+def collect_deck_card_names(folder_path):
+    """Return the name of every card listed in the .dck files under folder_path, once, in walk order.
+
+    Lines that aren't card entries are skipped with a notice, like the fetch walk always did.
+    """
+    invalid_lines = []
+    card_names = list(count_deck_cards(folder_path, invalid_lines))
+    for message in invalid_lines:
+        print(f"Skipping {message[0].lower()}{message[1:]}")
+    return card_names
+
+NUMBER_CHARS = frozenset('0123456789+-.eE')
+
+def iter_json_items(file, keyed, chunk_size=1 << 20):
+    """
+    Yield the items of a top-level JSON array, or the (key, value) pairs of a top-level JSON
+    object when keyed is set, one at a time, reading the file in chunks so only the current
+    item (plus one chunk) is ever held in memory.
+    """
+    open_char, close_char = ('{', '}') if keyed else ('[', ']')
+    container = 'object' if keyed else 'array'
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    at_eof = False
+    key = None
+    # open_char at the start, then 'first' (an item or close_char), 'separator' (',' or close_char) after
+    # each item and 'item' after a ','; objects also go through 'colon' and 'value' between key and value
+    expecting = open_char
+
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+
+        value = end = None
+        if position < len(buffer):
+            char = buffer[position]
+            if expecting == open_char:
+                if char != open_char:
+                    raise ValueError(f"Expected a JSON {container}")
+                position += 1
+                expecting = 'first'
+                continue
+            if char == close_char and expecting in ('first', 'separator'):
+                return
+            if expecting in ('separator', 'colon'):
+                if char != (',' if expecting == 'separator' else ':'):
+                    raise ValueError(f"Unexpected character {char!r} in JSON {container}")
+                position += 1
+                expecting = 'item' if expecting == 'separator' else 'value'
+                continue
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if at_eof:
+                    raise
+            # A number running up to the end of the buffer may still continue in the next chunk
+            if end is not None and (at_eof or (end < len(buffer) and buffer[end] not in NUMBER_CHARS)):
+                position = end
+                if keyed and expecting in ('first', 'item'):
+                    if not isinstance(value, str):
+                        raise ValueError("Expected a string key in JSON object")
+                    key = value
+                    expecting = 'colon'
+                else:
+                    yield (key, value) if keyed else value
+                    expecting = 'separator'
+                continue
+
+        if at_eof:
+            raise ValueError(f"Unexpected end of JSON {container}")
+        chunk = file.read(chunk_size)
+        buffer = buffer[position:] + chunk
+        position = 0
+        at_eof = not chunk
+
+def iter_json_array(file, chunk_size=1 << 20):
+    """Yield the elements of a top-level JSON array one at a time (see iter_json_items)."""
+    return iter_json_items(file, False, chunk_size)
+
+def iter_json_object(file, chunk_size=1 << 20):
+    """Yield the (key, value) pairs of a top-level JSON object one at a time (see iter_json_items)."""
+    return iter_json_items(file, True, chunk_size)
+
+def write_massaged_cards(output_file, cards):
+    """Write cards one at a time, formatted exactly like json.dump(list(cards), indent=4)."""
     with open(output_file, 'w') as file:
-        json.dump(new_format_cards, file, indent=4)
+        file.write('[')
+        first = True
+        for card in cards:
+            file.write('\n    ' if first else ',\n    ')
+            file.write(json.dumps(card, indent=4).replace('\n', '\n    '))
+            first = False
+        file.write('\n]' if not first else ']')
+
+def convert_bulk_data(bulk_file, output_file, card_names):
+    """
+    Massage the cards named in card_names straight out of a Scryfall bulk-data dump (a JSON
+    array), streaming the dump instead of loading it. The first printing of each name wins,
+    double-faced cards match on their front face, and the output keeps the order of card_names.
+    Returns the names that weren't in the dump.
+    """
+    wanted_names = set(card_names)
+    massaged_cards = {}
+
+    with open(bulk_file, 'r', encoding='utf-8') as file:
+        for card_data in iter_json_array(file):
+            scryfall_name = card_data.get('name', '')
+            for card_name in (scryfall_name, scryfall_name.split(' // ')[0]):
+                if card_name in wanted_names and card_name not in massaged_cards:
+                    massaged_cards[card_name] = massage_card(card_name, card_data)
+                    break
+            if len(massaged_cards) == len(wanted_names):
+                break
+
+    write_massaged_cards(output_file, (massaged_cards[card_name] for card_name in card_names
+                                       if card_name in massaged_cards))
+    return [card_name for card_name in card_names if card_name not in massaged_cards]
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Convert fetched Scryfall cards to the format convert.py reads.")
+    parser.add_argument('--bulk-data', metavar='FILE',
+                        help="read the cards from a local Scryfall bulk-data dump instead of all_cards.json")
+    parser.add_argument('--decks', default='decks',
+                        help="folder of .dck files whose cards are kept from the bulk dump (default: decks)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="massage all_cards.json in this many processes (default: 1)")
+    parser.add_argument('--chunk-size', type=int, default=MASSAGE_CHUNK_SIZE,
+                        help=f"cards massaged per chunk (default: {MASSAGE_CHUNK_SIZE})")
+    parser.add_argument('--output', default=MASSAGED_CARDS_FILE,
+                        help=f"file the massaged cards are written to (default: {MASSAGED_CARDS_FILE})")
+    args = parser.parse_args(argv)
+
+    # Specify the input and output file paths
+    input_file = "all_cards.json"
+    output_file = args.output
 
-# Specify the input and output file paths
-input_file = "all_cards.json"
-output_file = "all_cards_massaged.json"
+    if args.bulk_data:
+        missing_card_names = convert_bulk_data(args.bulk_data, output_file, collect_deck_card_names(args.decks))
+        for card_name in missing_card_names:
+            print(f"Card not found in bulk data: {card_name}")
+    else:
+        # Convert and save the cards in the new format
+        errors = convert_to_new_format(input_file, output_file, args.workers, args.chunk_size)
+        if errors:
+            for error in errors:
+                print(error)
+            print(f"{len(errors)} cards failed validation; '{output_file}' was left unchanged.")
+            sys.exit(1)
 
-# Convert and save the cards in the new format
-convert_to_new_format(input_file, output_file)
+    print(f"Conversion completed. Cards saved in the new format as '{output_file}'.")
 
-print("Conversion completed. Cards saved in the new format as 'all_cards_massaged.json'.")
+if __name__ == '__main__':
+    main()
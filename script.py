@@ -1,9 +1,34 @@
+import argparse
+import asyncio
 import requests
 import os
 import json
 import time
 import urllib.parse
 
+from deckfile import DeckCard, read_deck_file
+from massager import MASSAGED_CARDS_FILE, collect_deck_card_names, convert_bulk_data
+
+SCRYFALL_API_URL = "https://api.scryfall.com"
+COLLECTION_BATCH_SIZE = 75  # Most identifiers Scryfall accepts per /cards/collection request
+JOURNAL_FLUSH_SIZE = 75  # Fetched cards buffered before they are appended to the journal
+
+class RateLimiter:
+    """Space out request starts so they stay within a requests-per-second budget."""
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = asyncio.get_running_loop().time()
+            if self.next_slot > now:
+                await asyncio.sleep(self.next_slot - now)
+                now = self.next_slot
+            self.next_slot = now + self.interval
+
 def load_existing_cards(json_file_path):
     if os.path.exists(json_file_path):
         with open(json_file_path, 'r') as file:
@@ -14,13 +39,85 @@ def save_card_to_json(json_file_path, card_data):
     with open(json_file_path, 'w') as file:
         json.dump(card_data, file, indent=4)
 
-def query_scryfall(card_name, max_retries=3):
+class CardJournal:
+    """Append fetched cards to a JSON Lines journal, one card per line, in batches."""
+
+    def __init__(self, journal_path, flush_size=JOURNAL_FLUSH_SIZE):
+        self.journal_path = journal_path
+        self.flush_size = flush_size
+        self.pending = []
+
+    def append(self, card_name, card_data):
+        self.pending.append(json.dumps({'name': card_name, 'card': card_data}))
+        if len(self.pending) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        with open(self.journal_path, 'a') as file:
+            file.write('\n'.join(self.pending) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        self.pending = []
+
+def journal_path_for(json_file_path):
+    return os.path.splitext(json_file_path)[0] + '.jsonl'
+
+def replay_journal(journal_path, all_cards):
+    """
+    Apply the cards recorded in a journal on top of all_cards.
+    Returns the number of records replayed.
+    """
+    if not os.path.exists(journal_path):
+        return 0
+
+    replayed = 0
+    with open(journal_path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A crash can leave the last record half-written
+            all_cards[record['name']] = record['card']
+            replayed += 1
+    return replayed
+
+def compact_journal(json_file_path, all_cards):
+    """Write all_cards to the JSON file in one go and remove the journal it now covers."""
+    temp_file_path = json_file_path + '.tmp'
+    save_card_to_json(temp_file_path, all_cards)
+    os.replace(temp_file_path, json_file_path)
+
+    journal_path = journal_path_for(json_file_path)
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+
+def load_cards_with_journal(json_file_path):
+    """
+    Load all_cards.json plus any cards a previous, interrupted run left in the journal.
+    Recovered cards are compacted into the JSON file straight away, so the journal starts empty.
+    """
+    all_cards = load_existing_cards(json_file_path)
+    replayed = replay_journal(journal_path_for(json_file_path), all_cards)
+    if replayed:
+        print(f"Recovered {replayed} cards from '{journal_path_for(json_file_path)}'.")
+        compact_journal(json_file_path, all_cards)
+    return all_cards
+
+def named_card_url(card_name, base_url=SCRYFALL_API_URL):
+    encoded_card_name = urllib.parse.quote(card_name)  # Encode special characters like '&'
+    return f"{base_url.rstrip('/')}/cards/named?exact={encoded_card_name}"
+
+def query_scryfall(card_name, max_retries=3, base_url=SCRYFALL_API_URL):
     """
     Query the Scryfall API for a given card name with retry mechanism.
     Returns the card data.
     """
-    encoded_card_name = urllib.parse.quote(card_name)  # Encode special characters like '&'
-    url = f"https://api.scryfall.com/cards/named?exact={encoded_card_name}"
+    url = named_card_url(card_name, base_url)
     retry_interval = 1  # start with 1 second
 
     for attempt in range(max_retries):
@@ -39,47 +136,200 @@ def query_scryfall(card_name, max_retries=3):
     print(f"Failed to retrieve {card_name} after {max_retries} attempts - Request URL: {url}")
     return None
 
+def create_session(pool_size):
+    """Create an HTTP session whose connection pool can serve pool_size requests at once."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+async def query_scryfall_async(session, semaphore, rate_limiter, card_name, max_retries=3, base_url=SCRYFALL_API_URL):
+    """
+    Query the Scryfall API for a given card name on a shared session, with the same
+    exponential backoff as query_scryfall. Returns the card data.
+    """
+    url = named_card_url(card_name, base_url)
+    retry_interval = 1  # start with 1 second
+
+    for attempt in range(max_retries):
+        async with semaphore:
+            await rate_limiter.wait()
+            try:
+                response = await asyncio.to_thread(session.get, url, timeout=30)
+                if response.status_code == 200:
+                    return response.json()
+                else:
+                    print(f"Non-200 response for {card_name} on attempt {attempt + 1} - Request URL: {url}")
+            except requests.RequestException as e:
+                print(f"Error on attempt {attempt + 1} for {card_name}: {e} - Request URL: {url}")
+
+        # Back off outside the semaphore so a retrying card doesn't hold up the others
+        await asyncio.sleep(retry_interval)
+        retry_interval *= 2  # double the interval for each retry
+
+    print(f"Failed to retrieve {card_name} after {max_retries} attempts - Request URL: {url}")
+    return None
+
+def collection_card_names(card_data):
+    """The names a requested card may match a collection entry by: its full name and, for
+    'A // B' cards, its front face."""
+    card_name = card_data.get('name', '')
+    names = [card_name, card_name.split(' // ')[0]]
+    names += [face.get('name', '') for face in card_data.get('card_faces', [])[:1]]
+    return [name.casefold() for name in names if name]
+
+def match_collection_cards(card_names, cards):
+    """Pair the cards of a collection response with the requested names by their names, not
+    their position. Requested names no card matches are left out."""
+    requested = {card_name.casefold(): card_name for card_name in card_names}
+    found = {}
+    for card_data in cards:
+        for name in collection_card_names(card_data):
+            card_name = requested.get(name)
+            if card_name is not None and card_name not in found:
+                found[card_name] = card_data
+                break
+    return found
+
+async def query_scryfall_collection_async(session, semaphore, rate_limiter, card_names, max_retries=3,
+                                         base_url=SCRYFALL_API_URL):
+    """
+    Look up a batch of card names with one /cards/collection request, retrying like
+    query_scryfall_async. Returns a dict of card name to card data for the names Scryfall
+    found, matched by name; names no returned card matches (or the whole batch, if the
+    request keeps failing) are left out for the caller to retry one by one.
+    """
+    url = f"{base_url.rstrip('/')}/cards/collection"
+    payload = {'identifiers': [{'name': card_name} for card_name in card_names]}
+    retry_interval = 1  # start with 1 second
+
+    for attempt in range(max_retries):
+        async with semaphore:
+            await rate_limiter.wait()
+            try:
+                response = await asyncio.to_thread(session.post, url, json=payload, timeout=60)
+                if response.status_code == 200:
+                    return match_collection_cards(card_names, response.json().get('data', []))
+                else:
+                    print(f"Non-200 response for a batch of {len(card_names)} cards on attempt {attempt + 1} - Request URL: {url}")
+            except requests.RequestException as e:
+                print(f"Error on attempt {attempt + 1} for a batch of {len(card_names)} cards: {e} - Request URL: {url}")
+
+        await asyncio.sleep(retry_interval)
+        retry_interval *= 2  # double the interval for each retry
+
+    print(f"Failed to retrieve a batch of {len(card_names)} cards after {max_retries} attempts - Request URL: {url}")
+    return {}
+
+async def fetch_cards(card_names, on_card, base_url=SCRYFALL_API_URL, concurrency=8, requests_per_second=10,
+                      max_retries=3, batch_size=COLLECTION_BATCH_SIZE):
+    """
+    Fetch card_names and call on_card(card_name, card_data) for every card found.
+    Names are resolved batch_size at a time through the collection endpoint, and
+    whatever a batch doesn't find falls back to single-name lookups. Requests overlap,
+    but on_card is called in the order of card_names.
+    """
+    session = create_session(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    rate_limiter = RateLimiter(requests_per_second)
+
+    async def fetch_batch(batch):
+        found = await query_scryfall_collection_async(session, semaphore, rate_limiter, batch, max_retries, base_url)
+        missing = [card_name for card_name in batch if card_name not in found]
+        results = await asyncio.gather(*(query_scryfall_async(session, semaphore, rate_limiter, card_name,
+                                                              max_retries, base_url)
+                                         for card_name in missing))
+        found.update((card_name, card_data) for card_name, card_data in zip(missing, results) if card_data)
+        return found
+
+    batches = [card_names[start:start + batch_size] for start in range(0, len(card_names), batch_size)]
+    tasks = [asyncio.create_task(fetch_batch(batch)) for batch in batches]
+    try:
+        for batch, task in zip(batches, tasks):
+            found = await task
+            for card_name in batch:
+                if card_name in found:
+                    on_card(card_name, found[card_name])
+    finally:
+        for task in tasks:
+            task.cancel()
+        session.close()
+
 def convert_dck_to_json_format(dck_file_path):
     """
     Converts a .dck file to a JSON format.
     """
     converted_cards = []
 
-    with open(dck_file_path, 'r') as file:
-        for line in file:
-            if '|' in line and line[0].isdigit():
-                _, card_info = line.split(' ', 1)
-                card_name = card_info.split('|')[0].strip()
-                card_data = query_scryfall(card_name)
-                if card_data:
-                    converted_cards.append(card_data)
+    # Like the fetch walk, skip lines that aren't card entries instead of failing the whole deck
+    for record in read_deck_file(dck_file_path, invalid_lines=[]):
+        if isinstance(record, DeckCard) and '|' in record.line:
+            card_data = query_scryfall(record.name)
+            if card_data:
+                converted_cards.append(card_data)
 
     return converted_cards
 
-def process_dck_files_in_directory(folder_path):
-    all_cards = load_existing_cards(os.path.join(folder_path, 'all_cards.json'))
-
-    for root, dirs, files in os.walk(folder_path):
-        for filename in files:
-            if filename.endswith('.dck'):
-                dck_file_path = os.path.join(root, filename)
-                with open(dck_file_path, 'r') as file:
-                    for line in file:
-                        line = line.strip()  # Remove leading and trailing spaces
-                        if line and line[0].isdigit() and '|' in line:
-                            # Split the line into quantity and card info
-                            card_count, card_info = line.split(' ', 1)
-                            card_name = card_info.split('|')[0].strip()
-
-                            if card_name not in all_cards:
-                                card_data = query_scryfall(card_name)
-                                if card_data:
-                                    all_cards[card_name] = card_data
-                                    save_card_to_json(os.path.join(folder_path, 'all_cards.json'), all_cards)
+def process_dck_files_in_directory(folder_path, base_url=SCRYFALL_API_URL, concurrency=8, requests_per_second=10):
+    json_file_path = os.path.join(folder_path, 'all_cards.json')
+    all_cards = load_cards_with_journal(json_file_path)
+
+    # Collect every card that still needs fetching, once, in the order the decks list them
+    missing_card_names = [card_name for card_name in collect_deck_card_names(folder_path)
+                          if card_name not in all_cards]
+
+    # New cards go to the journal as they arrive and are compacted into all_cards.json at the end
+    journal = CardJournal(journal_path_for(json_file_path))
+
+    def save_card(card_name, card_data):
+        all_cards[card_name] = card_data
+        journal.append(card_name, card_data)
+
+    try:
+        asyncio.run(fetch_cards(missing_card_names, save_card, base_url, concurrency, requests_per_second))
+    finally:
+        journal.flush()
+
+    if os.path.exists(journal.journal_path):
+        compact_journal(json_file_path, all_cards)
 
     print(f"All cards have been processed and saved to 'all_cards.json'.")
 
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog,
+                                     description="Fetch the Scryfall data of every card in a folder of .dck files.")
+    parser.add_argument('folder_path', nargs='?', default='decks',
+                        help="folder containing the .dck files; all_cards.json is written there (default: decks)")
+    parser.add_argument('--base-url', default=SCRYFALL_API_URL,
+                        help="Scryfall API root, e.g. a local stub server for offline testing")
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help="maximum number of requests in flight (default: 8)")
+    parser.add_argument('--rate', type=float, default=10,
+                        help="maximum requests started per second; 0 disables the limit (default: 10)")
+    parser.add_argument('--bulk-data', metavar='FILE',
+                        help="skip the API and massage the deck cards straight out of a local Scryfall "
+                             "bulk-data dump into the --output file")
+    parser.add_argument('--output', default=MASSAGED_CARDS_FILE,
+                        help=f"file --bulk-data writes the massaged cards to, like massager.py "
+                             f"(default: {MASSAGED_CARDS_FILE})")
+    parser.add_argument('--compact', action='store_true',
+                        help="only fold the journal of an interrupted run into all_cards.json, without fetching")
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    if args.bulk_data:
+        massaged_file_path = args.output
+        missing_card_names = convert_bulk_data(args.bulk_data, massaged_file_path,
+                                               collect_deck_card_names(args.folder_path))
+        for card_name in missing_card_names:
+            print(f"Card not found in bulk data: {card_name}")
+        print(f"All cards found in the bulk data have been saved to '{massaged_file_path}'.")
+    elif args.compact:
+        load_cards_with_journal(os.path.join(args.folder_path, 'all_cards.json'))
+    else:
+        process_dck_files_in_directory(args.folder_path, args.base_url, args.concurrency, args.rate)
 
-# Example usage for a folder containing .dck files
-folder_path = 'C:\\Users\\jhoff\\OneDrive\\Documents\\temp\\decks'
-process_dck_files_in_directory(folder_path)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import argparse
+import json
+import threading
+import urllib.parse
+from functools import cached_property
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from cardstore import load_cards
+from convert import build_lotr_index, top_candidates
+from deckconvert import convert_deck_lines, load_converted_cards
+
+# Resident conversion server.
+#
+# The card pools are loaded and indexed the first time a request needs them and then stay
+# in memory, so each request only pays for the lookup itself:
+#
+#   GET  /convert?name=Llanowar+Elves&name=Counterspell   conversions from converted.json
+#   GET  /candidates?name=Llanowar+Elves&top=5            ranked LOTR candidates with their scores
+#   POST /deck                                            a .dck file in, the converted deck out
+#   POST /reload                                          drop the pools; they reload on next use
+
+class CardPools:
+    """The card data a resident process keeps in memory, each piece loaded on first use."""
+
+    def __init__(self, mtg_json_file='database.json', lotr_json_file='lotr.json', converted_json_file='converted.json'):
+        self.mtg_json_file = mtg_json_file
+        self.lotr_json_file = lotr_json_file
+        self.converted_json_file = converted_json_file
+
+    @cached_property
+    def mtg_cards_by_name(self):
+        mtg_cards_by_name = {}
+        for card in load_cards(self.mtg_json_file):
+            mtg_cards_by_name.setdefault(card['name'], card)
+        return mtg_cards_by_name
+
+    @cached_property
+    def lotr_index(self):
+        return build_lotr_index(load_cards(self.lotr_json_file))
+
+    @cached_property
+    def conversion_map(self):
+        return load_converted_cards(self.converted_json_file)
+
+    def preload(self):
+        """Load and index every pool now instead of on the first request."""
+        return self.mtg_cards_by_name, self.lotr_index, self.conversion_map
+
+    def reload(self):
+        for name in ('mtg_cards_by_name', 'lotr_index', 'conversion_map'):
+            self.__dict__.pop(name, None)
+
+    def convert(self, card_names):
+        conversions = []
+        for card_name in card_names:
+            lotr_name, set_code = self.conversion_map.get(card_name, (None, None))
+            conversions.append({'mtg_card': card_name, 'lotr_card': lotr_name, 'setCode': set_code})
+        return conversions
+
+    def candidates(self, card_name, k):
+        mtg_card = self.mtg_cards_by_name.get(card_name)
+        if mtg_card is None:
+            return None
+        return [{
+            'lotr_card': candidate.card['name'],
+            'setCode': candidate.card.get('setCode', ''),
+            'score': candidate.score,
+            'type_score': candidate.type_score,
+            'power_toughness_score': candidate.power_toughness_score,
+            'colors_match': candidate.colors_match,
+            'mana_value_delta': candidate.mana_value_delta
+        } for candidate in top_candidates(mtg_card, self.lotr_index, k)]
+
+    def convert_deck(self, deck_text):
+        return convert_deck_lines(deck_text.splitlines(), self.conversion_map)
+
+def make_request_handler(pools):
+    # One request at a time: the pools and their caches are shared and not locked
+    lock = threading.Lock()
+
+    class ConversionRequestHandler(BaseHTTPRequestHandler):
+        def send_body(self, status, body, content_type='application/json'):
+            data = (json.dumps(body) if content_type == 'application/json' else body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', f"{content_type}; charset=utf-8")
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urllib.parse.urlsplit(self.path)
+            query = urllib.parse.parse_qs(url.query)
+            with lock:
+                if url.path == '/convert':
+                    self.send_body(200, pools.convert(query.get('name', [])))
+                elif url.path == '/candidates':
+                    card_name = query.get('name', [''])[0]
+                    try:
+                        k = int(query.get('top', ['5'])[0])
+                    except ValueError:
+                        self.send_body(400, {'error': "'top' must be a number"})
+                        return
+                    if k < 1:
+                        self.send_body(400, {'error': "'top' must be at least 1"})
+                        return
+                    candidates = pools.candidates(card_name, k)
+                    if candidates is None:
+                        self.send_body(404, {'error': f"No card named '{card_name}'"})
+                    else:
+                        self.send_body(200, candidates)
+                else:
+                    self.send_body(404, {'error': f"Unknown path '{url.path}'"})
+
+        def do_POST(self):
+            url = urllib.parse.urlsplit(self.path)
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+            with lock:
+                if url.path == '/deck':
+                    try:
+                        self.send_body(200, pools.convert_deck(body), 'text/plain')
+                    except ValueError as e:
+                        self.send_body(400, {'error': str(e)})
+                elif url.path == '/reload':
+                    pools.reload()
+                    self.send_body(200, {'reloaded': True})
+                else:
+                    self.send_body(404, {'error': f"Unknown path '{url.path}'"})
+
+    return ConversionRequestHandler
+
+def serve(pools, host='127.0.0.1', port=8765):
+    server = HTTPServer((host, port), make_request_handler(pools))
+    print(f"Serving card conversions on http://{host}:{server.server_port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Keep the card pools in memory and answer conversion "
+                                                            "requests over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8765, help="port to listen on (default: 8765)")
+    parser.add_argument('--database', default='database.json', help="MTG card pool (default: database.json)")
+    parser.add_argument('--lotr', default='lotr.json', help="LOTR card pool (default: lotr.json)")
+    parser.add_argument('--converted', default='converted.json',
+                        help="card conversions written by convert.py (default: converted.json)")
+    parser.add_argument('--preload', action='store_true',
+                        help="load and index every pool at startup instead of on the first request")
+    args = parser.parse_args(argv)
+
+    pools = CardPools(args.database, args.lotr, args.converted)
+    if args.preload:
+        pools.preload()
+    serve(pools, args.host, args.port)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import io
+import json
+import unittest
+
+from massager import iter_json_array, iter_json_object
+
+# iter_json_array/iter_json_object must yield exactly what json.load gives for the whole
+# document, whatever the read chunk size, and reject what json.load rejects.
+
+CHUNK_SIZES = (1, 2, 3, 5, 7, 16, 1 << 20)
+
+CARDS = {
+    "Fire // Ice": {"type_line": "Instant // Instant", "mana_cost": "{1}{R} // {1}{U}", "cmc": 4.0},
+    "Lim-Dûl's Vault": {"oracle_text": "{1}{U}{B}, {T}: Look at the top five cards.\n\"Quote\"", "prices": {}},
+    "Delver of Secrets": {"card_faces": [{"power": "1"}, {"power": "3"}], "games": ["paper", "mtgo"]},
+    "Numbers": {"values": [0, -2.5, 10000000000.0, 1e-300, -0.0, 123456789, 1.5e+300], "flag": True, "none": None},
+    "Empty": {"list": [], "object": {}, "string": ""},
+    "Nested": [[[{"a": [1, {"b": [2, 3]}]}]]],
+    "Punctuation in strings": ["{", "}", "[", "]", ",", ":", "\\", "\""]
+}
+
+def parse_object(text, chunk_size):
+    return list(iter_json_object(io.StringIO(text), chunk_size))
+
+def parse_array(text, chunk_size):
+    return list(iter_json_array(io.StringIO(text), chunk_size))
+
+class IterJsonTest(unittest.TestCase):
+    def test_object_matches_json_load(self):
+        for indent in (None, 4):
+            text = json.dumps(CARDS, indent=indent)
+            for chunk_size in CHUNK_SIZES:
+                with self.subTest(indent=indent, chunk_size=chunk_size):
+                    self.assertEqual(parse_object(text, chunk_size), list(json.loads(text).items()))
+
+    def test_array_matches_json_load(self):
+        for indent in (None, 4):
+            text = json.dumps(list(CARDS.values()), indent=indent)
+            for chunk_size in CHUNK_SIZES:
+                with self.subTest(indent=indent, chunk_size=chunk_size):
+                    self.assertEqual(parse_array(text, chunk_size), json.loads(text))
+
+    def test_number_split_across_chunks(self):
+        # '-2' | '.5' must not be read as -2, nor '1' | 'e5' as 1
+        for text in ('[-2.5]', '{"a":-2.5}', '[1e5,2]', '{"a": 10000000000.0, "b": 7}', '[12345]'):
+            for chunk_size in CHUNK_SIZES:
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    parse = parse_object if text.startswith('{') else parse_array
+                    expected = json.loads(text)
+                    self.assertEqual(parse(text, chunk_size),
+                                     list(expected.items()) if isinstance(expected, dict) else expected)
+
+    def test_empty_containers(self):
+        for chunk_size in CHUNK_SIZES:
+            self.assertEqual(parse_object(' { } ', chunk_size), [])
+            self.assertEqual(parse_array('[\n]', chunk_size), [])
+
+    def test_malformed_input_raises(self):
+        malformed_objects = ('', '{', '{"a" 1}', '{"a":1,}', '{1:2}', '{"a":1', '{"a":-}', '[1]')
+        malformed_arrays = ('', '[', '[1 2]', '[1,]', '[1.]', '[1', '{"a":1}', '["unterminated]')
+        for chunk_size in CHUNK_SIZES:
+            for text in malformed_objects:
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    self.assertRaises(ValueError, parse_object, text, chunk_size)
+            for text in malformed_arrays:
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    self.assertRaises(ValueError, parse_array, text, chunk_size)
+
+    def test_truncated_document_raises(self):
+        text = json.dumps(CARDS, indent=4)
+        for end in range(len(text) - 1):
+            with self.subTest(end=end):
+                self.assertRaises(ValueError, parse_object, text[:end], 7)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+from manacost import colors_to_mask, parse_mana_cost
+
+# NumPy backend for ranking fuzzy matches (convert.py --backend numpy).
+#
+# The LOTR pool is encoded once as arrays: color bitmasks, rarity codes, mana values and
+# per-character counts of the distinct type and power/toughness strings. For a block of
+# MTG cards, the color-subset and rarity filters and difflib's quick_ratio upper bound of
+# both string criteria are computed against the whole pool as matrix operations. Only
+# candidates whose bound can still matter get a real SequenceMatcher ratio. The rankings
+# come out identical to convert.rank_card, which validate_rankings checks.
+
+BLOCK_SIZE = 256
+
+# NumPy is optional and slow to import, so it is only loaded once the backend is used
+np = None
+
+def load_numpy():
+    """Import NumPy on first use; returns False when it isn't installed."""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+def numpy_available():
+    return load_numpy()
+
+def intern_strings(values):
+    """Return the distinct strings in first-seen order and the index of each value among them."""
+    ids = {}
+    value_ids = np.array([ids.setdefault(value, len(ids)) for value in values], dtype=np.int64)
+    return list(ids), value_ids
+
+def char_count_matrix(strings, alphabet):
+    """Count the characters of each string over alphabet; characters outside it are left out."""
+    counts = np.zeros((len(strings), len(alphabet)), dtype=np.int32)
+    for row, text in enumerate(strings):
+        for char in text:
+            column = alphabet.get(char)
+            if column is not None:
+                counts[row, column] += 1
+    return counts
+
+def upper_bound_matrix(counts, lengths, pool_counts, pool_lengths):
+    """difflib's quick_ratio for every pair of rows, computed the same way as convert.similarity_upper_bound."""
+    matches = np.zeros((len(counts), len(pool_counts)), dtype=np.int64)
+    for column in range(counts.shape[1]):
+        matches += np.minimum(counts[:, column][:, None], pool_counts[:, column][None, :])
+    total_lengths = lengths[:, None] + pool_lengths[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bounds = 2.0 * matches / total_lengths
+    bounds[total_lengths == 0] = 1.0
+    return bounds
+
+class PoolArrays:
+    """The LOTR pool of a lotr index encoded as arrays."""
+
+    def __init__(self, lotr_index):
+        records = lotr_index['records']
+        self.records = records
+        self.positions = np.array([record.position for record in records], dtype=np.int64)
+        self.color_masks = np.array([colors_to_mask(record.colors) for record in records], dtype=np.uint8)
+        self.mana_values = np.array([record.mana_value for record in records], dtype=np.int64)
+        self.rarity_ids = {}
+        self.rarity_codes = np.array([self.rarity_ids.setdefault(record.rarity, len(self.rarity_ids))
+                                      for record in records], dtype=np.int64)
+
+        self.type_strings, self.type_ids = intern_strings([record.type for record in records])
+        self.power_toughness_strings, self.power_toughness_ids = intern_strings(
+            [record.power_toughness for record in records])
+
+        characters = sorted(set(''.join(self.type_strings + self.power_toughness_strings)))
+        self.alphabet = {char: column for column, char in enumerate(characters)}
+        self.type_counts = char_count_matrix(self.type_strings, self.alphabet)
+        self.type_lengths = np.array([len(text) for text in self.type_strings], dtype=np.int64)
+        self.power_toughness_counts = char_count_matrix(self.power_toughness_strings, self.alphabet)
+        self.power_toughness_lengths = np.array([len(text) for text in self.power_toughness_strings], dtype=np.int64)
+
+    def string_bounds(self, texts, pool_counts, pool_lengths, pool_ids):
+        """Upper bounds of texts (one per MTG card) against every pool card, as a cards x pool matrix."""
+        distinct_texts, text_ids = intern_strings(texts)
+        counts = char_count_matrix(distinct_texts, self.alphabet)
+        lengths = np.array([len(text) for text in distinct_texts], dtype=np.int64)
+        bounds = upper_bound_matrix(counts, lengths, pool_counts, pool_lengths)
+        return bounds[text_ids][:, pool_ids]
+
+    def block_arrays(self, mtg_cards, normalize_rarity, format_power_toughness):
+        """Candidate mask and combined upper bound of a block of MTG cards against the whole pool."""
+        mtg_masks = np.array([parse_mana_cost(card.get('manaCost', '')).color_mask for card in mtg_cards],
+                             dtype=np.uint8)
+        mtg_rarities = np.array([self.rarity_ids.get(normalize_rarity(card['rarity']), -1) for card in mtg_cards],
+                                dtype=np.int64)
+
+        # Colors must be a subset of the card's colors, and the rarity must be the same
+        candidate_mask = (((self.color_masks[None, :] & ~mtg_masks[:, None]) == 0)
+                          & (self.rarity_codes[None, :] == mtg_rarities[:, None]))
+
+        bounds = np.minimum(
+            self.string_bounds([card['type'] for card in mtg_cards], self.type_counts, self.type_lengths,
+                               self.type_ids),
+            self.string_bounds([format_power_toughness(card) for card in mtg_cards], self.power_toughness_counts,
+                               self.power_toughness_lengths, self.power_toughness_ids))
+        return mtg_masks, candidate_mask, bounds
+
+def rank_with_bounds(mtg_card, mtg_mask, candidates, bounds, pool, levels, similarity_ratio, format_power_toughness):
+    """Rank one card from its candidate pool indexes (in lotr.json order) and their upper bounds.
+
+    A start level settles on the first level at or below it that the best score reaches,
+    so the best score, found by branch and bound over the bounds, fixes every level at
+    once. At the settled level the card is picked like scored_matcher does: the first
+    passing candidate with exact colors, else the passing one with the highest mana
+    value. Scores are computed only as those searches need them.
+    """
+    card_type = mtg_card['type']
+    mtg_power_toughness = format_power_toughness(mtg_card)
+    scores = {}
+
+    def score(candidate):
+        if candidate not in scores:
+            record = pool.records[candidates[candidate]]
+            scores[candidate] = min(similarity_ratio(card_type, record.type),
+                                    similarity_ratio(mtg_power_toughness, record.power_toughness))
+        return scores[candidate]
+
+    best_score = -1.0
+    for candidate in np.argsort(-bounds, kind='stable'):
+        if bounds[candidate] <= best_score:
+            break
+        best_score = max(best_score, score(int(candidate)))
+
+    exact_colors = pool.color_masks[candidates] == mtg_mask
+    mana_values = pool.mana_values[candidates]
+    picks = {}
+
+    def pick(level):
+        if level not in picks:
+            reachable = bounds >= level
+            record_index = None
+            for candidate in np.flatnonzero(exact_colors & reachable):
+                if score(int(candidate)) >= level:
+                    record_index = candidates[candidate]
+                    break
+            else:
+                reachable_candidates = np.flatnonzero(reachable)
+                # Highest mana value first, the earliest candidate on a tie
+                for candidate in reachable_candidates[np.lexsort((reachable_candidates,
+                                                                   -mana_values[reachable_candidates]))]:
+                    if score(int(candidate)) >= level:
+                        record_index = candidates[candidate]
+                        break
+            picks[level] = pool.records[record_index].position
+        return picks[level]
+
+    ranking = []
+    for start in range(len(levels)):
+        settled = next((index for index in range(start, len(levels)) if levels[index] <= best_score), None)
+        if settled is None:
+            ranking.append((None, len(levels) - 1))
+        else:
+            ranking.append((pick(levels[settled]), settled))
+    return ranking
+
+def rank_cards_vectorized(mtg_cards, lotr_index, levels, block_size=BLOCK_SIZE):
+    """Rank every MTG card like convert.rank_card, a block of cards at a time."""
+    from convert import format_power_toughness, needs_fuzzy_match, normalize_rarity, similarity_ratio
+
+    if not load_numpy():
+        raise RuntimeError("the numpy backend needs NumPy; install it with 'pip install numpy'")
+    pool = lotr_index.get('arrays')
+    if pool is None:
+        pool = lotr_index['arrays'] = PoolArrays(lotr_index)
+
+    rankings = [None] * len(mtg_cards)
+    fuzzy_positions = [position for position, mtg_card in enumerate(mtg_cards)
+                       if needs_fuzzy_match(mtg_card, lotr_index)]
+    for block_start in range(0, len(fuzzy_positions), block_size):
+        block_positions = fuzzy_positions[block_start:block_start + block_size]
+        block_cards = [mtg_cards[position] for position in block_positions]
+        mtg_masks, candidate_mask, bounds = pool.block_arrays(block_cards, normalize_rarity, format_power_toughness)
+        for row, (position, mtg_card) in enumerate(zip(block_positions, block_cards)):
+            candidates = np.flatnonzero(candidate_mask[row])
+            rankings[position] = rank_with_bounds(mtg_card, mtg_masks[row], candidates, bounds[row, candidates], pool,
+                                                  levels, similarity_ratio, format_power_toughness)
+    return rankings
+
+def validate_rankings(mtg_cards, lotr_index, levels, rankings):
+    """Compare rankings against the pure-Python rank_card; return the names of the cards that differ."""
+    from convert import rank_card
+
+    return [mtg_card['name'] for mtg_card, ranking in zip(mtg_cards, rankings)
+            if rank_card(mtg_card, lotr_index, levels) != ranking]